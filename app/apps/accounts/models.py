@@ -1,12 +1,12 @@
 from apps.base.models import BaseEntity
-from apps.digikala.digikala import DGClient
+from apps.digikala.digikala import AsyncDGClient
 
 
 class Profile(BaseEntity):
     chat_id: str = ""
     token: str = ""
 
-    def access_token(self):
-        data = DGClient().get_auth(self.token)
+    async def access_token(self):
+        data = await AsyncDGClient().get_auth(self.token)
         access_token = data.get("data", {}).get("access_token")
         return access_token
@@ -0,0 +1,39 @@
+import httpx
+import openai
+from singleton import Singleton
+
+from server.config import Settings
+
+
+class OpenAIClient(metaclass=Singleton):
+    """Process-wide async OpenAI client on one keep-alive connection pool."""
+
+    def __init__(self):
+        self._client: openai.AsyncOpenAI | None = None
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        if self._client is None or self._client.is_closed():
+            http_client = httpx.AsyncClient(
+                proxy=Settings.PROXY or None,
+                limits=httpx.Limits(
+                    max_connections=Settings.AI_CONCURRENCY * 2,
+                    max_keepalive_connections=Settings.AI_CONCURRENCY,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(Settings.OPENAI_TIMEOUT, connect=10),
+            )
+            self._client = openai.AsyncOpenAI(
+                api_key=Settings.OPENAI_API_KEY,
+                http_client=http_client,
+                max_retries=Settings.OPENAI_RETRIES,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed():
+            await self._client.close()
+
+
+def get_openai() -> openai.AsyncOpenAI:
+    return OpenAIClient().client
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import uuid
+from contextvars import ContextVar
+
+from singleton import Singleton
+
+from apps.base.models import BaseEntity
+from server.config import Settings
+from utils.metrics import metrics
+
+from . import schemas
+
+ai_user: ContextVar[uuid.UUID | None] = ContextVar("ai_user", default=None)
+
+
+class AIRequest(schemas.AIRequest, BaseEntity):
+    """One LLM call, `template_key` holds the prompt key."""
+
+    user_id: uuid.UUID | None = None
+    model: str = "gpt-4o"
+    source: str = "pipeline"
+    prompt_chars: int = 0
+    completion_chars: int | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    ttft: float | None = None
+    latency: float | None = None
+    outcome: str = "ok"
+
+
+class AILedger(metaclass=Singleton):
+    """Buffer of LLM call records, written to Mongo in batches off the hot path."""
+
+    max_buffer = 10000
+
+    def __init__(self):
+        self.buffer: list[dict] = []
+
+    def record(self, **kwargs):
+        kwargs.setdefault("user_id", ai_user.get())
+        kwargs.setdefault(
+            "ai_status",
+            schemas.AIStatus.done if kwargs.get("outcome", "ok") == "ok" else "error",
+        )
+        self.buffer.append(kwargs)
+        if len(self.buffer) > self.max_buffer:
+            del self.buffer[0]
+            metrics.incr("ai_ledger.dropped")
+
+    async def flush(self):
+        items, self.buffer = self.buffer, []
+        if not items:
+            return
+        documents = []
+        for item in items:
+            try:
+                documents.append(AIRequest(**item))
+            except ValueError as e:
+                logging.warning(f"AI ledger record skipped: {e}")
+        try:
+            await AIRequest.insert_many(documents)
+            metrics.incr("ai_ledger.flushed", len(documents))
+        except Exception as e:
+            logging.warning(f"AI ledger flush of {len(items)} records failed: {e}")
+            metrics.incr("ai_ledger.dropped", len(items))
+
+    async def run(self, interval: float = None):
+        interval = interval or Settings.AI_LEDGER_FLUSH_INTERVAL
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+        finally:
+            await self.flush()
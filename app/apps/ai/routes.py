@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from typing import Literal
+
+from fastapi import APIRouter
+
+from utils.metrics import percentile
+
+from .ledger import AIRequest
+
+router = APIRouter(prefix="/ai", tags=["ai"])
+
+group_fields = {"prompt_key": "$template_key", "model": "$model", "user": "$user_id"}
+
+
+def summary(samples: list[float]) -> dict:
+    return {"p50": percentile(samples, 0.5), "p95": percentile(samples, 0.95)}
+
+
+@router.get("/usage")
+async def ai_usage_report(
+    group_by: Literal["prompt_key", "model", "user"] = "prompt_key", days: int = 7
+):
+    pipeline = [
+        {"$match": {"created_at": {"$gte": datetime.now() - timedelta(days=days)}}},
+        {
+            "$group": {
+                "_id": group_fields[group_by],
+                "calls": {"$sum": 1},
+                "errors": {"$sum": {"$cond": [{"$eq": ["$outcome", "ok"]}, 0, 1]}},
+                "prompt_tokens": {"$sum": "$prompt_tokens"},
+                "completion_tokens": {"$sum": "$completion_tokens"},
+                "latencies": {"$push": "$latency"},
+                "ttfts": {"$push": "$ttft"},
+            }
+        },
+        {"$sort": {"calls": -1}},
+    ]
+    rows = await AIRequest.aggregate(pipeline).to_list()
+    return [
+        {
+            group_by: str(row["_id"]) if row["_id"] is not None else None,
+            "calls": row["calls"],
+            "errors": row["errors"],
+            "prompt_tokens": row["prompt_tokens"],
+            "completion_tokens": row["completion_tokens"],
+            "latency": summary(row["latencies"]),
+            "ttft": summary(row["ttfts"]),
+        }
+        for row in rows
+    ]
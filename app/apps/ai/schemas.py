@@ -1,6 +1,8 @@
 from enum import Enum
 from typing import Any
 
+from pydantic import BaseModel
+
 from apps.ai.models import AIEngines
 from apps.base.schemas import OwnedEntitySchema, TaskSchema
 
@@ -25,3 +27,12 @@ class AIRequest(TaskSchema, OwnedEntitySchema):
     model: AIEngines = AIEngines.gpt_4o
     template_key: str | None = None
     ai_status: AIStatus = AIStatus.draft
+
+
+class AIUsage(BaseModel):
+    calls: int = 0
+    prompt_chars: int = 0
+
+    def add(self, messages: list[dict]):
+        self.calls += 1
+        self.prompt_chars += sum(len(message["content"]) for message in messages)
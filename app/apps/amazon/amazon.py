@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import re
+import time
+from urllib.parse import urlparse
+
+from apify_client import ApifyClientAsync
+from singleton import Singleton
+
+from server import db
+from server.config import Settings
+from utils.cache import hash_key
+from utils.metrics import metrics
+
+asin_pattern = re.compile(
+    r"(?:/dp/|/gp/product/|/gp/aw/d/|/product/|/exec/obidos/asin/|[?&]asin=)"
+    r"([A-Z0-9]{10})(?=[/?&#]|$)",
+    re.IGNORECASE,
+)
+running_statuses = {"READY", "RUNNING", "TIMING-OUT", "ABORTING"}
+MARKER_ERROR = object()
+
+
+def get_asin(url: str) -> str | None:
+    match = asin_pattern.search(url)
+    return match.group(1).upper() if match else None
+
+
+def product_key(url: str) -> str:
+    """Marketplace and ASIN of a product url, `amazon.com:B00NLZUM36`."""
+
+    host = urlparse(url).netloc.lower().removeprefix("www.")
+    asin = get_asin(url)
+    if asin is None:
+        # short links such as a.co or amzn.to carry no ASIN
+        return f"{host}:{hash_key(url)}"
+    return f"{host}:{asin}"
+
+
+def run_input(url: str) -> dict:
+    asin = get_asin(url)
+    if asin:
+        url = f"https://{urlparse(url).netloc}/dp/{asin}"
+    return {
+        "categoryOrProductUrls": [{"url": url}],
+        "maxItemsPerStartUrl": 100,
+        "proxyCountry": "AUTO_SELECT_PROXY_COUNTRY",
+        "maxOffers": 0,
+        "scrapeSellers": False,
+        "useCaptchaSolver": False,
+        "scrapeProductVariantPrices": False,
+    }
+
+
+class AmazonClient(metaclass=Singleton):
+    """Amazon product scraper on Apify.
+
+    Concurrent requests for one product share a single actor run through a
+    Redis marker holding the run id. Scraped products are cached by
+    `apps.providers.fetch` under the marketplace and ASIN key. When Redis is
+    unavailable the actor is run directly without sharing.
+    """
+
+    actor_id = "BG3WDrGdteHgZgbPK"
+    # a finished run id stays shared for a while, until its product is cached
+    finished_run_ttl = 300
+
+    def __init__(self):
+        self.client = ApifyClientAsync(Settings.APIFY_API_KEY)
+
+    @staticmethod
+    def run_key(key: str) -> str:
+        return f"amazon:run:{key}"
+
+    async def start_actor(self, url: str) -> str:
+        run = await self.client.actor(self.actor_id).start(run_input=run_input(url))
+        metrics.incr("amazon.run_started")
+        return run["id"]
+
+    async def marker(self, method: str, *args, **kwargs):
+        """Run a Redis command on the run marker, `MARKER_ERROR` if Redis fails."""
+
+        try:
+            return await getattr(db.redis, method)(*args, **kwargs)
+        except Exception as e:
+            logging.warning(f"Amazon run marker {method} failed: {e}")
+            metrics.incr("amazon.marker_error")
+            return MARKER_ERROR
+
+    async def start_run(self, key: str, url: str) -> str:
+        run_key = self.run_key(key)
+        claimed = await self.marker(
+            "set", run_key, "", nx=True, ex=Settings.AMAZON_RUN_TIMEOUT
+        )
+        if claimed is MARKER_ERROR:
+            # without Redis runs cannot be shared, scrape directly
+            return await self.start_actor(url)
+        if claimed:
+            try:
+                run_id = await self.start_actor(url)
+            except Exception:
+                await self.marker("delete", run_key)
+                raise
+            await self.marker("set", run_key, run_id, ex=Settings.AMAZON_RUN_TIMEOUT)
+            return run_id
+
+        # another process is starting or running the actor for this product
+        while (run_id := await self.marker("get", run_key)) == b"":
+            await asyncio.sleep(1)
+        if run_id is MARKER_ERROR:
+            return await self.start_actor(url)
+        if run_id is None:
+            return await self.start_run(key, url)
+        metrics.incr("amazon.run_shared")
+        return run_id.decode()
+
+    async def wait(self, run_id: str) -> dict:
+        """Long-poll the run with growing waits until it leaves the running states."""
+
+        deadline = time.monotonic() + Settings.AMAZON_RUN_TIMEOUT
+        wait_secs = 5
+        while True:
+            run = await self.client.run(run_id).wait_for_finish(wait_secs=wait_secs)
+            if run is None:
+                raise ValueError(f"Amazon run {run_id} not found")
+            if run.get("status") not in running_statuses:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Amazon run {run_id} did not finish")
+            wait_secs = min(wait_secs * 2, 60)
+
+        if run.get("status") != "SUCCEEDED":
+            raise ValueError(f"Amazon run {run_id} {run.get('status')}")
+        return run
+
+    async def fetch(self, key: str, url: str) -> dict:
+        start = time.perf_counter()
+        run_id = await self.start_run(key, url)
+        try:
+            run = await self.wait(run_id)
+            dataset = await self.client.dataset(run.get("defaultDatasetId")).list_items(
+                limit=1
+            )
+            if not dataset.items:
+                raise ValueError(f"Amazon product not found for {url}")
+        except Exception:
+            await self.marker("delete", self.run_key(key))
+            raise
+        # keep the finished run shared until the caller has cached the product,
+        # a process missing the cache meanwhile reads this dataset again
+        await self.marker("expire", self.run_key(key), self.finished_run_ttl)
+
+        metrics.observe("amazon.run_seconds", time.perf_counter() - start)
+        logging.info(
+            f"Amazon product {key} scraped in {time.perf_counter() - start:.1f}s"
+        )
+        return dataset.items[0]
+
+    async def get_product(self, url: str) -> dict:
+        return await self.fetch(product_key(url), url)
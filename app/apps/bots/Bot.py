@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import os
 
@@ -6,17 +5,11 @@ import singleton
 from telebot.async_telebot import AsyncTeleBot
 from telebot.asyncio_helper import ApiTelegramException
 
-from server.config import Settings
 from utils.texttools import split_text
 
-logger = logging.getLogger("bot")
-
+from .scheduler import EditScheduler
 
-async def reduce_message_length():
-    await asyncio.sleep(60 * 60)
-    Settings.MESSAGE_LENGTH = max(
-        Settings.MESSAGE_LENGTH // 2, Settings.MIN_MESSAGE_LENGTH
-    )
+logger = logging.getLogger("bot")
 
 
 class BaseBot(AsyncTeleBot):
@@ -51,8 +44,15 @@ class BaseBot(AsyncTeleBot):
         return self.link
 
     async def edit_message_text(self, text, *args, **kwargs):
+        if args:
+            return await self.send_edit(text, *args, **kwargs)
+        return await EditScheduler().edit(self, text, **kwargs)
+
+    async def send_edit(self, text, *args, **kwargs):
+        """Edit right away, rate limits are left to `EditScheduler`."""
+
         try:
-            await super().edit_message_text(text=text[:4096], *args, **kwargs)
+            return await super().edit_message_text(text=text[:4096], *args, **kwargs)
         except ApiTelegramException as e:
             if "message is not modified:" in str(e) or "message text is empty" in str(
                 e
@@ -60,13 +60,9 @@ class BaseBot(AsyncTeleBot):
                 logger.warning(f"edit_message_text error: {e}")
             elif "MESSAGE_TOO_LONG" in str(e):
                 logger.warning(f"edit_message_text error: {e}")
-            elif "Too Many Requests" in str(e):
-                Settings.MESSAGE_LENGTH *= 2
-                asyncio.create_task(reduce_message_length())
-                logger.warning(f"edit_message_text error: {e}")
             elif "can't parse entities" in str(e):
                 kwargs["parse_mode"] = ""
-                await self.edit_message_text(text, *args, **kwargs)
+                await self.send_edit(text, *args, **kwargs)
                 logger.warning(f"edit_message_text error: {e}, {text}")
             else:
                 raise e
@@ -81,8 +77,6 @@ class BaseBot(AsyncTeleBot):
             if "MESSAGE_TOO_LONG" in str(e):
                 logger.warning(f"send_message error: {e}")
             elif "Too Many Requests" in str(e):
-                Settings.MESSAGE_LENGTH *= 2
-                asyncio.create_task(reduce_message_length())
                 logger.warning(f"send_message error: {e}")
             elif "can't parse entities" in str(e):
                 kwargs["parse_mode"] = ""
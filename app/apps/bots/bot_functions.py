@@ -6,11 +6,10 @@ from telebot import async_telebot
 
 from apps.accounts.handlers import get_user_profile, get_usso_user
 from apps.ai.models import AIEngines
-from apps.bots import Bot, functions, keyboards, models, schemas
+from apps.bots import Bot, functions, jobs, keyboards, messages, models, schemas
+from apps.bots.services import get_provider
 from utils.b64tools import b64_decode_uuid
-from utils.texttools import is_valid_url
-from server.config import Settings
-from apps.bots.schemas import MessageStruct
+from utils.texttools import extract_urls, is_valid_url
 
 logger = logging.getLogger("bot")
 
@@ -34,12 +33,11 @@ command_key = {
 
 async def send_msg(bot: Bot.BaseBot, chat_id, key, **kwargs):
     try:
-        msg_struct = MessageStruct(**Settings().bot_messages(key))
-        keyboard = keyboards.dynamic_keyboard(msg_struct.btn)
+        message = messages.get_message(key)
         return await bot.send_message(
             chat_id=chat_id,
-            text=msg_struct.msg.format(**kwargs),
-            reply_markup=keyboard,
+            text=message.format(**kwargs),
+            reply_markup=message.keyboard,
         )
     except Exception as e:
         logging.error(e)
@@ -114,11 +112,43 @@ async def photo(message: schemas.MessageOwned, bot: Bot.BaseBot):
 
 
 
+async def product_urls(
+    message: schemas.MessageOwned, bot: Bot.BaseBot, urls: list[str]
+):
+    response: schemas.MessageOwned = await bot.reply_to(message, "لطفا منتظر باشید ...")
+    await jobs.submit_catalog(
+        urls=urls,
+        user_id=message.user.uid,
+        chat_id=message.chat.id,
+        response_id=response.message_id,
+        bot_name=bot.me,
+    )
+
+
+async def document(message: schemas.MessageOwned, bot: Bot.BaseBot):
+    file_info = await bot.get_file(message.document.file_id)
+    content = await bot.download_file(file_info.file_path)
+    found = extract_urls(content.decode("utf-8-sig", errors="ignore"))
+    if not found:
+        return await bot.reply_to(message, "لینک محصولی در فایل پیدا نشد")
+    return await product_urls(message, bot, found)
+
+
 async def message(message: schemas.MessageOwned, bot: Bot.BaseBot):
     
     if message.photo:
         return await photo(message, bot)
 
+    if message.document:
+        return await document(message, bot)
+
+    found = extract_urls(message.text)
+    products = [url for url in found if get_provider(url)]
+    if len(products) > 1:
+        return await product_urls(message, bot, products)
+    if found and is_valid_url(message.text.strip()):
+        return await product_urls(message, bot, found)
+
     if (
         message.text.startswith("/")
         or message.text in command_key
@@ -1,19 +1,22 @@
+import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
 
 import aiohttp.client_exceptions
-import httpx
-import openai
 from metisai.async_metis import AsyncMetisBot
 from metisai.metistypes import Session as MetisSession
 from tapsage.async_tapsage import AsyncTapSageBot
 from tapsage.taptypes import Session as TapSession
 
 from apps.accounts.schemas import Profile
+from apps.ai.ledger import AILedger
 from apps.ai.models import AIEngines
-from apps.bots import handlers, keyboards, models, services
+from apps.bots import handlers, messages, models
+from apps.bots.scheduler import EditScheduler
 from apps.digikala import sheet
+from apps.digikala.exports import ExportStore
 from server.config import Settings
 from utils.texttools import split_text
 
@@ -30,26 +33,6 @@ def get_tapsage(profile: Profile) -> AsyncTapSageBot | AsyncMetisBot:
     return AsyncMetisBot(Settings.METIS_API_KEY, AIEngines.gpt_4o.metis_bot_id)
 
 
-def get_openai() -> openai.AsyncOpenAI:
-    openai.api_key = Settings.OPENAI_API_KEY
-    proxy_url = Settings.PROXY
-
-    if proxy_url:
-        proxies = {
-            "http": proxy_url,
-            "https": proxy_url,
-        }
-        http_client = httpx.AsyncClient(proxies=proxies)
-    else:
-        http_client = httpx.AsyncClient()
-
-    client = client = openai.AsyncOpenAI(
-        api_key=openai.api_key, http_client=http_client
-    )
-
-    return client
-
-
 async def get_tapsage_session(
     profile: Profile,
     tapsage: AsyncTapSageBot | AsyncMetisBot | None = None,
@@ -95,44 +78,33 @@ async def ai_response(
     bot_name: str = "telegram",
     **kwargs,
 ):
+    start, ttft, outcome, resp_text = time.perf_counter(), None, "ok", ""
     try:
         bot = handlers.get_bot(bot_name)
         tapsage = get_tapsage(profile)
         session = await get_tapsage_session(profile=profile, tapsage=tapsage, **kwargs)
         stream = tapsage.stream_messages(session, message, split_criteria={})
 
-        resp_text = ""
-        new_piece = ""
+        scheduler = EditScheduler()
         try:
             async for msg in stream:
-                new_piece += msg.message.content
-                if (
-                    new_piece
-                    and new_piece[-1] == " "
-                    or len(new_piece) > Settings.MESSAGE_LENGTH
-                ):
-                    resp_text += new_piece
-                    if resp_text.count("`") % 2 == 0:
-                        try:
-                            # logger.info(f"Response: {len(resp_text)}")
-                            await bot.edit_message_text(
-                                text=resp_text,
-                                chat_id=chat_id,
-                                message_id=response_id,
-                                inline_message_id=inline_message_id,
-                                parse_mode="markdown",
-                            )
-                        except Exception as e:
-                            logger.error(
-                                f"Error:\n{repr(e)}\n{len(resp_text)}\t{resp_text}"
-                            )
-
-                    new_piece = ""
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                resp_text += msg.message.content
+                if resp_text.strip() and resp_text.count("`") % 2 == 0:
+                    # pending edits are coalesced, so only the latest text is sent
+                    scheduler.submit(
+                        bot,
+                        resp_text,
+                        chat_id=chat_id,
+                        message_id=response_id,
+                        inline_message_id=inline_message_id,
+                        parse_mode="markdown",
+                    )
         except aiohttp.client_exceptions.ClientPayloadError as e:
+            outcome = "error"
             logger.warning(f"ai_response Error:\n{e}")
 
-        if new_piece:
-            resp_text += new_piece
         resp_text = resp_text.strip()
 
         msg_obj = models.Message(user_id=profile.user_id, content=resp_text)
@@ -182,66 +154,30 @@ async def ai_response(
     except Exception as e:
         import traceback
 
+        outcome = "error"
         logger.error(f"ai_response Error:\n{e}\n{traceback.format_exc()}")
         logger.error(resp_text)
-
-
-async def url_response(
-    *,
-    url: str,
-    user_id: str,
-    chat_id: str,
-    response_id: str,
-    bot_name: str,
-    **kwargs,
-):
-    bot = handlers.get_bot(bot_name)
-    if "amazon" in url:
-        provider = "Amazon"
-
-    elif "digikala" in url:
-        provider = "Digikala"
-
-    else:
-        # Sazito
-        if url[-1] == "/":
-            url = url[:-1]
-
-        try:
-            if "/api/v1/products" in url:
-                product_list = ["s"]
-                provider = "Sazito"
-        except aiohttp.client_exceptions.ClientResponseError as e:
-            product_list = None
-            logger.error(f"{type(e)}: {e}")
-            await bot.edit_message_text(
-                chat_id=chat_id, message_id=response_id, text="فروشنده پشتیبانی نمیشود"
-            )
-            return
-
-        if product_list:
-            provider = "Sazito"
-
-        else:
-            await bot.edit_message_text(
-                chat_id=chat_id, message_id=response_id, text="فروشنده پشتیبانی نمیشود"
-            )
-
-    from apps.bots.schemas import MessageStruct
-
-    sheet_url = await services.get_sheet(url, provider)
-
-    msg_struct = MessageStruct(**Settings().bot_messages("sent_url"))
-
-    text = msg_struct.msg.format(provider=provider, sheet_link=sheet_url)
-    sheet_id = sheet.get_sheet_id(sheet_url)
-
-    await bot.edit_message_text(
-        chat_id=chat_id,
-        message_id=response_id,
-        text=text,
-        reply_markup=keyboards.sheet_keyboard(sheet_id),
-    )
+    finally:
+        AILedger().record(
+            source="chat",
+            user_id=profile.user_id,
+            model=profile.data.ai_engine.value,
+            prompt=message,
+            prompt_chars=len(message),
+            completion_chars=len(resp_text),
+            ttft=ttft,
+            latency=time.perf_counter() - start,
+            outcome=outcome,
+        )
+
+
+async def send_sheet_file(bot, chat_id, sheet_url: str):
+    if not Settings.SHEET_SEND_FILE:
+        return
+    export = ExportStore().get(sheet.get_sheet_id(sheet_url))
+    if export:
+        content = await asyncio.to_thread(export.read)
+        await bot.send_document(chat_id, content, visible_file_name=export.name)
 
 
 async def image_response(
@@ -253,7 +189,6 @@ async def image_response(
     bot_name,
 ):
     import replicate
-    from apps.bots.schemas import MessageStruct
 
     client = replicate.Client(api_token=Settings.REPLICATE_API_TOKEN)
 
@@ -261,9 +196,7 @@ async def image_response(
 
     bot = handlers.get_bot(bot_name)
 
-    msg_struct = MessageStruct(**Settings().bot_messages("edit_image"))
-
-    text = msg_struct.msg.format(image_link=output)
+    text = messages.get_message("edit_image").format(image_link=output)
 
     # await bot.edit_message_text(chat_id=chat_id, message_id=response_id, text=text)
 
@@ -77,7 +77,7 @@ class BotFunctions(metaclass=singleton.Singleton):
         bot.register_message_handler(
             message,
             func=lambda _: True,
-            content_types=["text", "voice", "photo"],
+            content_types=["text", "voice", "photo", "document"],
             pass_bot=True,
         )
 
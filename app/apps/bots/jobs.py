@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from singleton import Singleton
+
+from apps.ai.ledger import ai_user
+from apps.base.models import TaskBaseEntity
+from apps.bots import functions, handlers, keyboards, messages, services
+from apps.bots.scheduler import EditScheduler
+from apps.digikala import sheet
+from server import db
+from server.config import Settings
+from utils.metrics import metrics
+
+stage_messages = {
+    "category": "catalog_category",
+    "attributes": "catalog_attributes",
+    "sheet": "catalog_sheet",
+    "products": "bulk_progress",
+}
+
+
+class CatalogTask(TaskBaseEntity):
+    """Sheet generation for one or more product urls requested from a chat."""
+
+    user_id: uuid.UUID | None = None
+    urls: list[str]
+    chat_id: int | str
+    response_id: int
+    bot_name: str
+    sheet_url: str | None = None
+    done: int = 0
+    failed: int = 0
+    attempts: int = 0
+
+    @property
+    def bulk(self) -> bool:
+        return len(self.urls) > 1
+
+
+async def edit_catalog_message(task: CatalogTask):
+    bot = handlers.get_bot(task.bot_name)
+    if task.task_status != "done":
+        # progress edits are queued, a rate limited chat must not hold the save
+        if task.task_report:
+            EditScheduler().submit(
+                bot, task.task_report, chat_id=task.chat_id, message_id=task.response_id
+            )
+        return
+
+    key = "bulk_done" if task.bulk else "sent_url"
+    text = messages.get_message(key).format(
+        done=task.done, failed=task.failed, sheet_link=task.sheet_url
+    )
+    await bot.edit_message_text(
+        chat_id=task.chat_id,
+        message_id=task.response_id,
+        text=text,
+        reply_markup=keyboards.sheet_keyboard(sheet.get_sheet_id(task.sheet_url)),
+    )
+    await functions.send_sheet_file(bot, task.chat_id, task.sheet_url)
+
+
+CatalogTask.add_signal(edit_catalog_message)
+
+
+class ProgressReporter:
+    """Saves and emits the progress of a task in the background.
+
+    `report` never waits on Mongo or Telegram. One update runs at a time and a
+    report arriving meanwhile replaces the one still waiting.
+    """
+
+    def __init__(self, task: CatalogTask):
+        self.task = task
+        self.pending: dict | None = None
+        self.flusher: asyncio.Task | None = None
+
+    def report(self, **kwargs):
+        self.pending = kwargs
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        while self.pending:
+            kwargs, self.pending = self.pending, None
+            try:
+                await self.task.update_and_emit(**kwargs)
+            except Exception as e:
+                logging.warning(f"catalog progress of {self.task.uid} failed: {e}")
+
+    async def close(self):
+        """Drop reports still waiting and let the running update finish."""
+
+        self.pending = None
+        if self.flusher is not None:
+            await asyncio.gather(self.flusher, return_exceptions=True)
+
+
+async def run_catalog(task: CatalogTask):
+    ai_user.set(task.user_id)
+    reporter = ProgressReporter(task)
+    last_stage, last_emit = None, 0.0
+
+    async def progress(stage, **data):
+        nonlocal last_stage, last_emit
+        if task.bulk != (stage == "products"):
+            return
+        now = time.monotonic()
+        if stage == last_stage and now - last_emit < Settings.BULK_PROGRESS_INTERVAL:
+            return
+        last_stage, last_emit = stage, now
+
+        total = data.get("total")
+        reporter.report(
+            task_progress=int(100 * data["done"] / total) if total else -1,
+            task_report=messages.get_message(stage_messages[stage]).format(**data),
+        )
+
+    services.progress_hook.set(progress)
+    try:
+        if task.bulk:
+            task.sheet_url, task.done, task.failed = await services.bulk_import(
+                task.urls,
+                lambda done, total, failed: progress(
+                    "products", done=done, total=total, failed=failed
+                ),
+            )
+        else:
+            url = task.urls[0]
+            task.sheet_url = await services.create_product_sheet(
+                url, services.get_provider(url)
+            )
+            task.done = 1
+    finally:
+        await reporter.close()
+    await task.update_and_emit(task_status="done", task_report="sheet ready")
+
+
+class CatalogQueue(metaclass=Singleton):
+    """Reliable Redis queue of catalog task ids.
+
+    Workers move a task id from `catalog:queue` to their own processing list
+    with BRPOPLPUSH and remove it only once the task finished, while a
+    heartbeat key marks the worker alive. Ids left in the list of a worker
+    whose heartbeat expired, or of this process before a restart, are pushed
+    back to the queue.
+
+    The web process runs `CATALOG_WORKERS` workers, set it to 0 to leave the
+    queue to `python -m server.catalog_worker` processes scaled on their own.
+    """
+
+    queue_key = "catalog:queue"
+    processing_prefix = "catalog:processing:"
+    heartbeat_prefix = "catalog:worker:"
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_key = f"{self.processing_prefix}{self.worker_id}"
+        self.heartbeat_key = f"{self.heartbeat_prefix}{self.worker_id}"
+
+    async def depth(self) -> int:
+        depth = await db.redis.llen(self.queue_key)
+        metrics.gauge("catalog.queue_depth", depth)
+        return depth
+
+    async def submit(self, task: CatalogTask):
+        await task.save()
+        await db.redis.lpush(self.queue_key, str(task.uid))
+        metrics.incr("catalog.submitted")
+        await self.depth()
+
+    async def recover(self, startup: bool = False) -> int:
+        recovered = 0
+        async for key in db.redis.scan_iter(match=f"{self.processing_prefix}*"):
+            worker_id = key.decode().removeprefix(self.processing_prefix)
+            if worker_id == self.worker_id:
+                if not startup:
+                    continue
+            elif await db.redis.exists(f"{self.heartbeat_prefix}{worker_id}"):
+                continue
+            while await db.redis.rpoplpush(key, self.queue_key):
+                recovered += 1
+
+        if recovered:
+            metrics.incr("catalog.recovered", recovered)
+            logging.info(f"Requeued {recovered} interrupted catalog tasks")
+        return recovered
+
+    async def heartbeat(self):
+        while True:
+            try:
+                await db.redis.set(self.heartbeat_key, 1, ex=Settings.CATALOG_LEASE_TTL)
+                await self.recover()
+            except Exception as e:
+                logging.warning(f"catalog heartbeat error: {e}")
+            await asyncio.sleep(Settings.CATALOG_LEASE_TTL / 3)
+
+    async def process(self, task_id: str):
+        task = await CatalogTask.get_item(uuid.UUID(task_id))
+        if task is None or task.task_status in ("done", "error"):
+            return
+
+        task.attempts += 1
+        if task.attempts > Settings.CATALOG_MAX_ATTEMPTS:
+            await task.update_and_emit(
+                task_status="error", task_report="خطا در ایجاد شیت"
+            )
+            return
+
+        start = time.perf_counter()
+        await task.update_and_emit(task_status="processing")
+        try:
+            await run_catalog(task)
+            metrics.incr("catalog.done")
+        except Exception as e:
+            logging.error(f"catalog task {task_id} failed: {e}")
+            metrics.incr("catalog.failed")
+            await task.update_and_emit(
+                task_status="error", task_report="خطا در ایجاد شیت"
+            )
+        finally:
+            metrics.observe("catalog.task_seconds", time.perf_counter() - start)
+
+    async def work(self):
+        while True:
+            try:
+                raw = await db.redis.brpoplpush(
+                    self.queue_key, self.processing_key, timeout=5
+                )
+            except Exception as e:
+                logging.warning(f"catalog queue error: {e}")
+                await asyncio.sleep(5)
+                continue
+            if raw is None:
+                continue
+
+            try:
+                await self.depth()
+                await self.process(raw.decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"catalog worker error: {e}")
+            await self.release(raw)
+
+    async def release(self, raw: bytes, attempts: int = 3):
+        for attempt in range(attempts):
+            try:
+                await db.redis.lrem(self.processing_key, 1, raw)
+                return
+            except Exception as e:
+                logging.warning(f"catalog release of {raw!r} failed: {e}")
+                await asyncio.sleep(2**attempt)
+        # left in the processing list, the next startup requeues it and
+        # `process` skips it once the task is done
+
+    async def run(self, workers: int = None):
+        """Requeue interrupted tasks, then serve the queue with `workers` workers.
+
+        Cancelling leaves in-flight ids in the processing list so the next
+        start picks them up again.
+        """
+
+        await self.recover(startup=True)
+        await asyncio.gather(
+            self.heartbeat(),
+            *[self.work() for _ in range(workers or Settings.CATALOG_WORKERS)],
+        )
+
+
+async def submit_catalog(
+    *, urls: list[str], user_id, chat_id, response_id: int, bot_name: str
+) -> CatalogTask | None:
+    if len(urls) == 1 and services.get_provider(urls[0]) is None:
+        bot = handlers.get_bot(bot_name)
+        await bot.edit_message_text(
+            chat_id=chat_id, message_id=response_id, text="فروشنده پشتیبانی نمیشود"
+        )
+        return None
+
+    task = CatalogTask(
+        user_id=user_id,
+        urls=[url.removesuffix("/") for url in urls[: Settings.BULK_MAX_URLS]],
+        chat_id=chat_id,
+        response_id=response_id,
+        bot_name=bot_name,
+    )
+    await CatalogQueue().submit(task)
+    return task
@@ -0,0 +1,39 @@
+import dataclasses
+
+from telebot.types import InlineKeyboardMarkup
+
+from apps.bots import keyboards
+from apps.bots.schemas import MessageStruct
+from server.config import config_store
+from utils.texttools import format_keys
+
+
+@dataclasses.dataclass
+class CompiledMessage:
+    struct: MessageStruct
+    keyboard: InlineKeyboardMarkup
+    fields: set[str]
+
+    def format(self, **kwargs) -> str:
+        if not self.fields:
+            return self.struct.msg
+        return self.struct.msg.format(**kwargs)
+
+
+compiled_messages: dict[str, tuple[int, CompiledMessage]] = {}
+
+
+def get_message(key: str) -> CompiledMessage:
+    config = config_store.load("bot_messages.json")
+    cached = compiled_messages.get(key)
+    if cached and cached[0] == config.mtime:
+        return cached[1]
+
+    struct = MessageStruct(**config.data[key])
+    message = CompiledMessage(
+        struct=struct,
+        keyboard=keyboards.dynamic_keyboard(struct.btn),
+        fields=format_keys(struct.msg),
+    )
+    compiled_messages[key] = (config.mtime, message)
+    return message
@@ -0,0 +1,179 @@
+import asyncio
+import dataclasses
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from singleton import Singleton
+from telebot.asyncio_helper import ApiTelegramException
+
+from server.config import Settings
+from utils.metrics import metrics
+
+logger = logging.getLogger("bot")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+@dataclasses.dataclass
+class PendingEdit:
+    bot: Any
+    text: str
+    kwargs: dict
+    futures: list[asyncio.Future] = dataclasses.field(default_factory=list)
+
+    def resolve(self, result=None, error: Exception | None = None):
+        for future in self.futures:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def retry_after(e: ApiTelegramException) -> float | None:
+    if e.error_code != 429:
+        return None
+    parameters = (e.result_json or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class EditScheduler(metaclass=Singleton):
+    """Outbound message edits paced by a token bucket per chat and a global one.
+
+    Edits of the same message that are still waiting are coalesced, only the
+    latest text is sent and every waiter gets its result. A 429 blocks the
+    chat for `retry_after` seconds and keeps the edit queued.
+    """
+
+    idle_bucket_seconds = 60
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(
+            Settings.BOT_GLOBAL_EDIT_RATE, Settings.BOT_GLOBAL_EDIT_RATE
+        )
+        self.buckets: dict[tuple, TokenBucket] = {}
+        self.pending: dict[tuple, OrderedDict[Any, PendingEdit]] = {}
+        self.workers: dict[tuple, asyncio.Task] = {}
+
+    def depth(self) -> int:
+        depth = sum(len(queue) for queue in self.pending.values())
+        metrics.gauge("bot.edits.queue_depth", depth)
+        return depth
+
+    @staticmethod
+    def consume(future: asyncio.Future):
+        if not future.cancelled():
+            future.exception()
+
+    def submit(self, bot, text: str, **kwargs) -> asyncio.Future:
+        """Queue an edit without waiting for it, returns a future of its result."""
+
+        chat_id = kwargs.get("chat_id")
+        message_id = kwargs.get("message_id") or kwargs.get("inline_message_id")
+        chat = (bot.me, chat_id if chat_id is not None else message_id)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self.consume)
+        queue = self.pending.setdefault(chat, OrderedDict())
+        edit = queue.get(message_id)
+        if edit is None:
+            queue[message_id] = PendingEdit(bot, text, kwargs, [future])
+        else:
+            edit.text, edit.kwargs = text, kwargs
+            edit.futures.append(future)
+            metrics.incr("bot.edits.dropped")
+
+        metrics.incr("bot.edits.submitted")
+        self.depth()
+        if chat not in self.workers:
+            self.workers[chat] = asyncio.create_task(self.drain(chat))
+        return future
+
+    async def edit(self, bot, text: str, **kwargs):
+        return await self.submit(bot, text, **kwargs)
+
+    def requeue(self, chat: tuple, message_id, edit: PendingEdit):
+        queue = self.pending.setdefault(chat, OrderedDict())
+        newer = queue.get(message_id)
+        if newer is not None:
+            newer.futures = edit.futures + newer.futures
+            return
+        queue[message_id] = edit
+        queue.move_to_end(message_id, last=False)
+
+    async def drain(self, chat: tuple):
+        bucket = self.buckets.setdefault(
+            chat,
+            TokenBucket(Settings.BOT_CHAT_EDIT_RATE, Settings.BOT_CHAT_EDIT_BURST),
+        )
+        try:
+            while self.pending.get(chat):
+                delay = max(bucket.wait_time(), self.global_bucket.wait_time())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                bucket.take()
+                self.global_bucket.take()
+                message_id, edit = self.pending[chat].popitem(last=False)
+                self.depth()
+
+                start = time.perf_counter()
+                try:
+                    result = await edit.bot.send_edit(edit.text, **edit.kwargs)
+                except ApiTelegramException as e:
+                    seconds = retry_after(e)
+                    if seconds is None:
+                        edit.resolve(error=e)
+                        continue
+                    logger.warning(f"edit rate limited in {chat}, retry in {seconds}s")
+                    metrics.incr("bot.edits.rate_limited")
+                    bucket.block(seconds)
+                    self.requeue(chat, message_id, edit)
+                    continue
+                except Exception as e:
+                    edit.resolve(error=e)
+                    continue
+
+                metrics.observe("bot.edits.seconds", time.perf_counter() - start)
+                edit.resolve(result)
+        finally:
+            self.workers.pop(chat, None)
+            if not self.pending.get(chat):
+                self.pending.pop(chat, None)
+            self.prune()
+
+    def prune(self):
+        now = time.monotonic()
+        for chat, bucket in list(self.buckets.items()):
+            if (
+                chat not in self.workers
+                and now - bucket.updated > self.idle_bucket_seconds
+                and now > bucket.blocked_until
+            ):
+                del self.buckets[chat]
@@ -1,31 +1,48 @@
 import logging
 import asyncio
 import json
-
-import aiohttp
-import openai
-from aiocache import cached
-from apify_client import ApifyClient
-
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from apps.ai.client import get_openai
+from apps.ai.ledger import AILedger
+from apps.ai.schemas import AIUsage
 from apps.digikala import sheet
-from apps.digikala.digikala import DGClient
+from apps.digikala.brands import get_brand_index, record_match
+from apps.digikala.cache import CategoryMetaCache
+from apps.digikala.categories import CategoryIndex, CategoryTree, product_query
+from apps.providers.compact import compact_product, product_text
+from apps.providers.fetch import ProductFetcher
+from apps.providers.registry import registry
+from server import db
 from server.config import Settings
-from utils.aionetwork import aio_request_session
-from utils.texttools import backtick_formatter, get_dict_data
+from utils.cache import TwoTierCache, hash_key
+from utils.jsonstream import FieldStream
+from utils.metrics import metrics
+from utils.texttools import backtick_formatter, normalize_text
+
 
+ai_usage: ContextVar[AIUsage | None] = ContextVar("ai_usage", default=None)
+progress_hook: ContextVar[Callable[..., Awaitable] | None] = ContextVar(
+    "progress_hook", default=None
+)
 
-@cached(ttl=3600)
-async def aio_request(*, method: str = "get", url: str = None, **kwargs) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await aio_request_session(session, method=method, url=url, **kwargs)
 
+async def report(stage: str, **data):
+    """Pass a pipeline stage to the progress hook of the running job, if any."""
 
-async def get_sheet_url(*args, **kwargs):
-    return "https://docs.google.com/spreadsheets/d/1WHDJsLY23fnQFoGp2H3UIvGsRMDQAfZB4U5XKvy0C_g/edit?gid=2089675657#gid=2089675657"
+    hook = progress_hook.get()
+    if hook is None:
+        return
+    try:
+        await hook(stage, **data)
+    except Exception as e:
+        logging.warning(f"progress hook {stage} failed: {e}")
 
 
-def guess_ai(product_data, prompt_key, **kwargs):
-    client = openai.Client(api_key=Settings.OPENAI_API_KEY)
+def get_messages(product_data, prompt_key, **kwargs):
     system_prompt = Settings().prompts(f"{prompt_key}_system")
     user_prompt = Settings().prompts(f"{prompt_key}_user")
 
@@ -36,92 +53,321 @@ def guess_ai(product_data, prompt_key, **kwargs):
         },
         {
             "role": "user",
-            "content": user_prompt.format(product=str(product_data), **kwargs),
+            "content": user_prompt.format(product=product_text(product_data), **kwargs),
         },
     ]
+    return messages
 
-    response = client.chat.completions.create(model="gpt-4o", messages=messages)
-    resp_text = backtick_formatter(response.choices[0].message.content)
-    return json.loads(resp_text)
 
+async def ai_completion(messages, model="gpt-4o", stats: dict | None = None):
+    response = await get_openai().chat.completions.create(
+        model=model, messages=messages
+    )
+    content = response.choices[0].message.content
+    if stats is not None:
+        stats["completion_chars"] = len(content or "")
+        if response.usage:
+            stats["prompt_tokens"] = response.usage.prompt_tokens
+            stats["completion_tokens"] = response.usage.completion_tokens
+    resp_text = backtick_formatter(content)
+    return json.loads(resp_text)
 
-async def amazon(url):
-    client = ApifyClient(Settings.APIFY_API_KEY)
 
-    run_input = {
-        "categoryOrProductUrls": [{"url": url}],
-        "maxItemsPerStartUrl": 100,
-        "proxyCountry": "AUTO_SELECT_PROXY_COUNTRY",
-        "maxOffers": 0,
-        "scrapeSellers": False,
-        "useCaptchaSolver": False,
-        "scrapeProductVariantPrices": False,
-    }
+ai_semaphore = asyncio.Semaphore(Settings.AI_CONCURRENCY)
+ai_cache = TwoTierCache(
+    "ai", ttl=Settings.AI_CACHE_TTL, maxsize=Settings.AI_CACHE_SIZE, redis=db.redis
+)
+
+
+async def model_completion(messages, prompt_key, model, refresh=False):
+    async def completion():
+        usage = ai_usage.get()
+        if usage:
+            usage.add(messages)
+
+        async with ai_semaphore:
+            stats, outcome = {}, "ok"
+            start = time.perf_counter()
+            try:
+                return await ai_completion(messages, model, stats)
+            except json.JSONDecodeError:
+                outcome = "invalid_json"
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                latency = time.perf_counter() - start
+                metrics.observe(f"ai.model.{model}.seconds", latency)
+                AILedger().record(
+                    template_key=prompt_key,
+                    model=model,
+                    prompt_chars=sum(len(str(m["content"])) for m in messages),
+                    latency=latency,
+                    outcome=outcome,
+                    **stats,
+                )
+
+    key = hash_key(prompt_key, messages, model)
+    return await ai_cache.get_or_set(key, completion, refresh=refresh)
+
+
+def escalation_reason(answer, validate=None) -> str | None:
+    if validate is not None:
+        try:
+            if not validate(answer):
+                return "invalid"
+        except Exception:
+            return "invalid"
+
+    confidence = answer.get("confidence") if isinstance(answer, dict) else None
+    if (
+        isinstance(confidence, (int, float))
+        and confidence < Settings.AI_ESCALATE_CONFIDENCE
+    ):
+        return "low_confidence"
+
+
+async def aio_guess_ai(
+    product_data, prompt_key, *, model=None, validate=None, refresh=False, **kwargs
+):
+    """Ask the cheapest model tier of `prompt_key` first and escalate on bad answers.
+
+    An answer escalates to the next tier when it is not valid JSON, `validate`
+    rejects it or it reports a `confidence` below `AI_ESCALATE_CONFIDENCE`.
+    Passing `model` pins a single model.
+    """
+
+    messages = get_messages(product_data, prompt_key, **kwargs)
+    tiers = [model] if model else Settings().model_tiers(prompt_key)
+
+    metrics.incr(f"ai.escalation.{prompt_key}.calls")
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        try:
+            answer = await model_completion(messages, prompt_key, tier, refresh)
+            reason = None if last else escalation_reason(answer, validate)
+        except json.JSONDecodeError:
+            if last:
+                raise
+            reason = "invalid_json"
+
+        if reason is None:
+            return answer
+
+        metrics.incr(f"ai.escalation.{prompt_key}.escalated")
+        metrics.incr(f"ai.escalation.reason.{reason}")
+        metrics.gauge(
+            f"ai.escalation.{prompt_key}.rate",
+            metrics.counters[f"ai.escalation.{prompt_key}.escalated"]
+            / metrics.counters[f"ai.escalation.{prompt_key}.calls"],
+        )
+        logging.info(f"{prompt_key} escalated from {tier} ({reason})")
+
+
+async def stream_fields(messages, prompt_key, stream: FieldStream, model=None):
+    """Yield the top-level fields of a streamed JSON completion as they close."""
+
+    model = model or Settings().model_tiers(prompt_key)[0]
+    key = hash_key(prompt_key, messages, model)
+    cached = await ai_cache.get(key)
+    if isinstance(cached, dict) and cached:
+        for field in cached.items():
+            yield field
+        return
+
+    usage = ai_usage.get()
+    if usage:
+        usage.add(messages)
+
+    answer, stats, outcome, ttft = {}, {"completion_chars": 0}, "ok", None
+    start = time.perf_counter()
+    async with ai_semaphore:
+        try:
+            response = await get_openai().chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in response:
+                if chunk.usage:
+                    stats["prompt_tokens"] = chunk.usage.prompt_tokens
+                    stats["completion_tokens"] = chunk.usage.completion_tokens
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                delta = chunk.choices[0].delta.content
+                stats["completion_chars"] += len(delta)
+                for field in stream.feed(delta):
+                    answer.update([field])
+                    yield field
+            if stream.close() or not stream.done or not answer:
+                outcome = "invalid_json"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            metrics.observe(f"ai.model.{model}.seconds", latency)
+            AILedger().record(
+                template_key=prompt_key,
+                model=model,
+                prompt_chars=sum(len(str(m["content"])) for m in messages),
+                ttft=ttft,
+                latency=latency,
+                outcome=outcome,
+                **stats,
+            )
+
+    # empty or partial answers are never cached, a retry must ask again
+    if outcome == "ok":
+        await ai_cache.set(key, answer)
+
+
+category_level_cache = TwoTierCache(
+    "category_level", ttl=Settings.AI_CACHE_TTL, redis=db.redis
+)
+
+
+async def get_category_tree(product_data):
+    tree = CategoryTree()
+    signature = " ".join(
+        sorted(set(normalize_text(product_query(product_data)).split()))
+    )
 
-    # Run the Actor and wait for it to finish
-    run: dict = client.actor("BG3WDrGdteHgZgbPK").call(run_input=run_input)
-    run_res = client.run(run.get("id")).get()
+    node = tree.root
+    while not node.is_leaf:
+        if len(node.children) == 1:
+            node = next(iter(node.children.values()))
+            continue
+
+        async def choose(node=node):
+            answer = await aio_guess_ai(
+                product_data,
+                "get_category_level",
+                validate=lambda answer: tree.choose(node, answer) is not None,
+                path=node.path or "-",
+                categories=json.dumps(list(node.children), ensure_ascii=False),
+            )
+            child = tree.choose(node, answer)
+            if child is None:
+                raise ValueError(f"Invalid category {answer} under {node.path}")
+            return child.name
+
+        if signature:
+            name = await category_level_cache.get_or_set(
+                hash_key(node.path, signature), choose
+            )
+        else:
+            name = await choose()
+
+        if name not in node.children:
+            raise ValueError(f"Invalid category {name} under {node.path}")
+        node = node.children[name]
+
+    return node.item
+
+
+async def get_category(product_data):
+    if Settings.CATEGORY_ROUTING == "tree":
+        try:
+            return await get_category_tree(product_data)
+        except ValueError as e:
+            logging.warning(f"category tree routing failed: {e}")
+
+    index = CategoryIndex()
+    categories = index.shortlist(product_data)
+    if not categories:
+        categories = Settings().categories
+
+    category = await aio_guess_ai(
+        product_data,
+        "get_category",
+        categories=json.dumps(categories, ensure_ascii=False),
+    )
+    return index.resolve(category)
 
-    while run_res.get("status") == "RUNNING":
-        await asyncio.sleep(5)
-        run_res = client.run(run.get("id")).get()
 
-    dataset = client.dataset(run.get("defaultDatasetId")).list_items().items
-    return dataset[0]
+def get_provider(url: str) -> str | None:
+    adapter = registry.match(url)
+    return adapter.name if adapter else None
 
 
-async def get_sheet(url, provider):
-    # return "https://docs.google.com/spreadsheets/d/1GdiHsAzDR6r7nPE17f-vTXu3DUQlphXvuU2mXFXwah4/edit?gid=0#gid=0"
-    # data
-    if provider == "Amazon":
-        product_data = await amazon(url)
-    elif provider == "Digikala":
-        product_data = DGClient().get_product_details(url).get("data")
-    elif provider == "Sazito":
-        product_data = (
-            await aio_request(method="get", url=url)
-            .get("result", {})
-            .get("product", {})
-        )
-    else:
-        return "فروشنده پشتیبانی نمیشود"
+async def fetch_product(url, provider):
+    return await ProductFetcher().get(url, provider)
 
-    try:
-        category = guess_ai(
-            product_data,
-            "get_category",
-            categories=json.dumps(Settings().categories, ensure_ascii=False),
-        )
-        category = Settings().get_category_data(category)
-        logging.info(category)
-        category_id = category.get("id")
 
-        # brand
-        r = DGClient().get_category_details(category.get("id"))
-        brands = r.get("data").get("bind").get("brands")
-        logging.info(brands)
+async def get_brand_id(product_data, category_id):
+    brands = await CategoryMetaCache().brands(category_id)
 
-        brand = guess_ai(
+    brand_index = get_brand_index(category_id, brands)
+    match = brand_index.match(product_data)
+    brand_row = match.brand
+    if brand_row and match.confidence >= Settings.BRAND_MATCH_CONFIDENCE:
+        record_match(match, llm=False)
+    else:
+        brand = await aio_guess_ai(
             product_data,
             "get_category_brand",
-            brands=json.dumps(brands, ensure_ascii=False),
+            validate=lambda answer: bool(brand_index.resolve(answer.get("brand"))),
+            brands=json.dumps(match.candidates or brands, ensure_ascii=False),
         )
-        brand_row = get_dict_data(brands, "title_fa", brand.get("brand"))
-        if not brand_row:
-            brand_row = get_dict_data(brands, "title_en", brand.get("brand"))
-        brand_id = brand_row.get("id")
-
-        logging.info(brand_id)
-
-        data = get_product_fields(product_data, category_id, brand_id, provider)
-        logging.info(data)
-        # data = {
-        #     "category_id": 1234,
-        #     "division_id": None,
-        #     "brand_id": 1234,
-        # }
-        gsheet = sheet.create_sheet_df([data])
-        return sheet.get_sheet_url(gsheet)
+        resolved = brand_index.resolve(brand.get("brand"))
+        if resolved is None and match.candidates:
+            # the shortlist may miss the true brand, ask again with all of them
+            brand = await aio_guess_ai(
+                product_data,
+                "get_category_brand",
+                brands=json.dumps(brands, ensure_ascii=False),
+            )
+            resolved = brand_index.resolve(brand.get("brand"))
+        brand_row = resolved or brand_row
+        record_match(match, llm=True)
+
+    logging.info(f"brand {brand_row} ({match.method}, {match.confidence})")
+    return brand_row.get("id") if brand_row else None
+
+
+async def get_product_row(url, provider, stages=None) -> tuple[dict, dict]:
+    """Fetch one product and fill its sheet row, returns `(category, row)`.
+
+    `stages` maps `fetch`, `classify`, `brand` and `attributes` to semaphores
+    so a bulk import can bound each stage separately.
+    """
+
+    stages = stages or {}
+    async with stages.get("fetch", nullcontext()):
+        product_data = await fetch_product(url, provider)
+    prompt_data = compact_product(product_data, registry.get(provider).fields)
+
+    async with stages.get("classify", nullcontext()):
+        category = await get_category(prompt_data)
+    logging.info(category)
+    category_id = category.get("id")
+    await report("category", category=CategoryIndex.path(category))
+
+    async with stages.get("brand", nullcontext()):
+        brand_id = await get_brand_id(prompt_data, category_id)
+    if brand_id is None:
+        logging.warning(f"no brand matched for {url}")
+
+    async with stages.get("attributes", nullcontext()):
+        data = await get_product_fields(
+            product_data, category_id, brand_id, provider, prompt_data
+        )
+    logging.info(data)
+    return category, data
+
+
+async def get_sheet(url, provider):
+    # return "https://docs.google.com/spreadsheets/d/1GdiHsAzDR6r7nPE17f-vTXu3DUQlphXvuU2mXFXwah4/edit?gid=0#gid=0"
+    if provider not in registry.adapters:
+        return "فروشنده پشتیبانی نمیشود"
+
+    try:
+        return await create_product_sheet(url, provider)
     except Exception as e:
         import traceback
 
@@ -130,17 +376,100 @@ async def get_sheet(url, provider):
         return "خطا در ایجاد شیت"
 
 
+async def create_product_sheet(url, provider) -> str:
+    usage = AIUsage()
+    ai_usage.set(usage)
+    try:
+        _, data = await get_product_row(url, provider)
+        await report("sheet")
+        gsheet = await asyncio.to_thread(sheet.create_sheet_df, [data])
+        return sheet.get_sheet_url(gsheet)
+    finally:
+        logging.info(
+            f"AI usage for {url}: {usage.calls} calls, {usage.prompt_chars} prompt chars"
+        )
+
+
+def worksheet_title(category: dict, used: set[str]) -> str:
+    title = CategoryIndex.path(category).split(" > ")[-1].strip()[:90] or "Sheet"
+    if title in used:
+        title = f"{title} {category.get('id')}"
+    used.add(title)
+    return title
+
+
+async def bulk_import(urls: list[str], progress=None) -> tuple[str, int, int]:
+    """Build one spreadsheet for many product urls, one worksheet per category.
+
+    `progress(done, total, failed)` is awaited after every product.
+    Returns the sheet url and the number of finished and failed products.
+    """
+
+    stages = {
+        "fetch": asyncio.Semaphore(Settings.BULK_FETCH_CONCURRENCY),
+        "classify": asyncio.Semaphore(Settings.BULK_AI_CONCURRENCY),
+        "brand": asyncio.Semaphore(Settings.BULK_AI_CONCURRENCY),
+        "attributes": asyncio.Semaphore(Settings.BULK_AI_CONCURRENCY),
+    }
+    usage = AIUsage()
+    ai_usage.set(usage)
+
+    categories: dict[int, dict] = {}
+    rows: dict[int, list[dict]] = {}
+    errors = []
+    done = 0
+
+    async def build(url):
+        nonlocal done
+        try:
+            provider = get_provider(url)
+            if provider is None:
+                raise ValueError("فروشنده پشتیبانی نمیشود")
+            category, data = await get_product_row(url, provider, stages)
+            categories[category.get("id")] = category
+            rows.setdefault(category.get("id"), []).append({"source_url": url} | data)
+        except Exception as e:
+            logging.warning(f"bulk import {url} failed: {e}")
+            errors.append({"source_url": url, "error": str(e)})
+
+        done += 1
+        if progress:
+            try:
+                await progress(done, len(urls), len(errors))
+            except Exception as e:
+                logging.warning(f"bulk import progress failed: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[build(url) for url in urls])
+
+    used = set()
+    worksheets = {
+        worksheet_title(categories[category_id], used): category_rows
+        for category_id, category_rows in rows.items()
+    }
+    if errors:
+        worksheets["errors"] = errors
+
+    gsheet = await asyncio.to_thread(sheet.create_sheet_dfs, worksheets)
+    logging.info(
+        f"bulk import of {len(urls)} urls in {time.perf_counter() - start:.1f}s, "
+        f"{len(errors)} failed, AI usage: {usage.calls} calls, "
+        f"{usage.prompt_chars} prompt chars"
+    )
+    return sheet.get_sheet_url(gsheet), done - len(errors), len(errors)
+
+
 def get_product_types(product_data, types):
     return json.dumps([1234])
 
 
-def get_product_model(product_data):
+async def get_product_model(product_data):
     return {
         "model": "",
         "description": "",
         "disadvantages": json.dumps([]),
         "advantages": json.dumps([]),
-    } | guess_ai(product_data, "product_title")
+    } | await aio_guess_ai(product_data, "product_title")
     return {
         "model": "S22 fan edition",
         "description": "این محصول از توانایی های عجیبی برخوردار است",
@@ -165,29 +494,32 @@ def package_size(product_data):
     }
 
 
-def get_attribute_value(product_data, attribute):
+async def get_attribute_value(product_data, attribute):
     if attribute.get("type") in ["input", "text"]:
-        return guess_ai(
+        return await aio_guess_ai(
             product_data,
             "attribute_match_text",
+            validate=lambda answer: valid_answer(attribute, answer),
             field_name=attribute.get("title"),
             hint=attribute.get("hint"),
             field_values=attribute.get("values"),
         )
         return f'{attribute.get("type")} value'
     if attribute.get("type") == "checkbox":
-        return guess_ai(
+        return await aio_guess_ai(
             product_data,
             "attribute_match_checkbox",
+            validate=lambda answer: valid_answer(attribute, answer),
             field_name=attribute.get("title"),
             hint=attribute.get("hint"),
             field_values=attribute.get("values"),
         )
         return list(attribute.get("values").keys())[0]
     if attribute.get("type") == "select":
-        return guess_ai(
+        return await aio_guess_ai(
             product_data,
             "attribute_match_select",
+            validate=lambda answer: valid_answer(attribute, answer),
             field_name=attribute.get("title"),
             hint=attribute.get("hint"),
             field_values=attribute.get("values"),
@@ -197,35 +529,170 @@ def get_attribute_value(product_data, attribute):
         )
 
 
-def get_attributes(product_data, category_id):
-    attributes = DGClient().get_category_attribute(category_id)
-    result = {}
+def attribute_options(attribute) -> list[str]:
+    values = attribute.get("values") or {}
+    if isinstance(values, dict):
+        values = values.values()
+    return [v.get("text") if isinstance(v, dict) else v for v in values]
+
+
+def validate_attribute_value(attribute, value):
+    if value is None:
+        return None
+
+    if attribute.get("type") in ["input", "text"]:
+        if isinstance(value, (list, dict)) or str(value).strip() == "":
+            return None
+        return value
+
+    options = attribute_options(attribute)
+    if attribute.get("type") == "checkbox":
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        return value if value in options else None
+    if attribute.get("type") == "select":
+        if not isinstance(value, list):
+            value = [value]
+        if not value or any(v not in options for v in value):
+            return None
+        return value
+
+
+def valid_answer(attribute, answer) -> bool:
+    value = answer.get("value") if isinstance(answer, dict) else None
+    return validate_attribute_value(attribute, value) is not None
+
+
+def attribute_schema(attribute) -> dict:
+    field = {
+        "name": attribute.get("title"),
+        "type": attribute.get("type"),
+        "hint": attribute.get("hint"),
+    }
+    if attribute.get("type") in ["checkbox", "select"]:
+        field["values"] = attribute_options(attribute)
+    return field
+
+
+def attribute_chunks(product_data, attributes, budget=None) -> list[list[dict]]:
+    if budget is None:
+        budget = Settings.AI_BATCH_PROMPT_CHARS
+    available = budget - len(product_text(product_data))
+
+    chunks = [[]]
+    size = 0
     for attribute in attributes:
-        result[attribute.get("title")] = json.dumps(
-            get_attribute_value(product_data, attribute), ensure_ascii=False
+        field = attribute_schema(attribute)
+        field_size = len(json.dumps(field, ensure_ascii=False))
+        if chunks[-1] and size + field_size > available:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(field)
+        size += field_size
+    return [chunk for chunk in chunks if chunk]
+
+
+async def get_attribute_values_batch(product_data, attributes):
+    """Stream the batched answers and resolve each attribute as its field closes.
+
+    Fields that are missing, fail to parse or fail validation are retried one
+    attribute at a time while the rest of the stream is still generating.
+    """
+
+    by_title = {attribute.get("title"): attribute for attribute in attributes}
+    values: dict[str, dict] = {}
+    retries: dict[str, asyncio.Task] = {}
+
+    async def progress():
+        await report("attributes", done=len(values), total=len(by_title))
+
+    async def retry_value(title):
+        values[title] = await get_attribute_value(product_data, by_title[title])
+        await progress()
+        return values[title]
+
+    def retry(title):
+        if title in by_title and title not in values and title not in retries:
+            metrics.incr("ai.stream.field_retry")
+            retries[title] = asyncio.create_task(retry_value(title))
+
+    async def accept(title, answer):
+        attribute = by_title.get(title)
+        if attribute is None or title in values or title in retries:
+            return
+        value = validate_attribute_value(attribute, answer)
+        if value is None:
+            retry(title)
+        else:
+            values[title] = {"name": title, "value": value}
+            await progress()
+
+    async def stream_chunk(chunk):
+        messages = get_messages(
+            product_data,
+            "attribute_match_batch",
+            fields=json.dumps(chunk, ensure_ascii=False),
         )
+        stream = FieldStream()
+        try:
+            async for title, answer in stream_fields(
+                messages, "attribute_match_batch", stream
+            ):
+                await accept(title, answer)
+        except Exception as e:
+            logging.warning(f"batch attribute error: {e}")
+        for title in stream.failed:
+            retry(title)
+
+    chunks = attribute_chunks(product_data, attributes)
+    await asyncio.gather(*[stream_chunk(chunk) for chunk in chunks])
+    for title in by_title:
+        retry(title)
+
+    async def result(title):
+        if title in retries:
+            return await retries[title]
+        return values[title]
+
+    return await asyncio.gather(
+        *[result(attribute.get("title")) for attribute in attributes]
+    )
 
-    return result
 
+async def get_attributes(product_data, category_id):
+    attributes = await CategoryMetaCache().attributes(category_id)
+    if Settings.AI_BATCH_ATTRIBUTES:
+        values = await get_attribute_values_batch(product_data, attributes)
+    else:
+        done = 0
 
-def get_images(product_data, origin):
-    if origin == "Amazon":
-        return product_data.get("highResolutionImages", [])
-    if origin == "Digikala":
-        return (
-            product_data.get("data")
-            .get("intrack")
-            .get("eventData")
-            .get("productImageUrl")
-        )
-    if origin == "Sazito":
-        images = product_data.get("images", [])
-        return [image.get("url") for image in images]
+        async def value(attribute):
+            nonlocal done
+            result = await get_attribute_value(product_data, attribute)
+            done += 1
+            await report("attributes", done=done, total=len(attributes))
+            return result
+
+        values = await asyncio.gather(*[value(attribute) for attribute in attributes])
+    result = {}
+    for attribute, value in zip(attributes, values):
+        result[attribute.get("title")] = json.dumps(value, ensure_ascii=False)
 
-    return []
+    return result
+
+
+async def get_product_fields(
+    product_data, category_id, brand_id, origin, prompt_data=None
+):
+    if prompt_data is None:
+        prompt_data = product_data
+    model, attributes = await asyncio.gather(
+        get_product_model(prompt_data),
+        get_attributes(prompt_data, category_id),
+    )
 
+    product = registry.get(origin).normalize(product_data)
 
-def get_product_fields(product_data, category_id, brand_id, origin):
     result = {}
     result.update(
         {
@@ -234,17 +701,17 @@ def get_product_fields(product_data, category_id, brand_id, origin):
             "brand_id": brand_id,
             "product_type_ids": get_product_types(product_data, ["type1", "type2"]),
             "color_id": 1234,
-            "is_iranian": origin in ["Sazito"],
+            "is_iranian": product.is_iranian,
             "product_classes": json.dumps([123]),
         }
     )
-    result.update(get_product_model(product_data))
+    result.update(model)
     result.update(mefa_id(product_data))
     result.update(package_size(product_data))
 
-    result.update(get_attributes(product_data, category_id))
+    result.update(attributes)
 
-    images = get_images(product_data, origin)
+    images = product.images
     for i in range(5):
         result[f"image_{i+1}"] = images[i] if i < len(images) else None
 
@@ -0,0 +1,259 @@
+import dataclasses
+import re
+from collections import Counter, OrderedDict
+
+from server.config import Settings
+from utils.metrics import metrics
+from utils.texttools import normalize_text
+
+from .categories import product_query
+
+latin_translation = str.maketrans(
+    {
+        "ا": "a",
+        "آ": "a",
+        "ب": "b",
+        "پ": "p",
+        "ت": "t",
+        "ث": "s",
+        "ج": "j",
+        "چ": "ch",
+        "ح": "h",
+        "خ": "kh",
+        "د": "d",
+        "ذ": "z",
+        "ر": "r",
+        "ز": "z",
+        "ژ": "zh",
+        "س": "s",
+        "ش": "sh",
+        "ص": "s",
+        "ض": "z",
+        "ط": "t",
+        "ظ": "z",
+        "ع": "a",
+        "غ": "gh",
+        "ف": "f",
+        "ق": "gh",
+        "ک": "k",
+        "گ": "g",
+        "ل": "l",
+        "م": "m",
+        "ن": "n",
+        "و": "u",
+        "ه": "h",
+        "ی": "i",
+    }
+)
+vowels_pattern = re.compile(r"[aeiouyhw\s]+")
+repeats_pattern = re.compile(r"(.)\1+")
+
+
+def skeleton(text: str) -> str:
+    """Script-insensitive consonant skeleton, `سامسونگ` and `Samsung` -> `smsng`."""
+
+    text = normalize_text(text).translate(latin_translation)
+    text = text.replace("c", "k").replace("q", "k").replace("x", "ks")
+    return repeats_pattern.sub(r"\1", vowels_pattern.sub("", text))
+
+
+def similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+def product_brands(product_data, depth: int = 4) -> list[str]:
+    texts = []
+
+    def walk(data, level):
+        if level > depth:
+            return
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if key in ("brand", "manufacturer") and isinstance(value, dict):
+                    for title_key in ("title_fa", "title_en", "name", "title"):
+                        if value.get(title_key):
+                            texts.append(str(value[title_key]))
+                elif key in ("brand", "manufacturer") and value:
+                    texts.append(str(value))
+                elif isinstance(value, (dict, list)):
+                    walk(value, level + 1)
+        elif isinstance(data, list):
+            for value in data[:10]:
+                walk(value, level + 1)
+
+    walk(product_data, 0)
+    return texts
+
+
+@dataclasses.dataclass
+class BrandMatch:
+    brand: dict | None
+    confidence: float
+    method: str
+    candidates: list[dict] = dataclasses.field(default_factory=list)
+
+
+def grams(text: str, size: int = 3) -> set[str]:
+    padded = f" {text} "
+    return {padded[i : i + size] for i in range(max(len(padded) - size + 1, 1))}
+
+
+class BrandIndex:
+    """Normalized Persian/English index over one category's brand list."""
+
+    max_words = 4
+    # shorter skeletons collide too often to skip the LLM on their own
+    confident_skeleton = 5
+    fuzzy_pool = 50
+
+    def __init__(self, brands: list[dict]):
+        self.brands = brands
+        self.by_name: dict[str, list[dict]] = {}
+        self.by_skeleton: dict[str, list[dict]] = {}
+        self.by_gram: dict[str, set[int]] = {}
+
+        for i, brand in enumerate(brands):
+            for title in self.titles(brand):
+                name = normalize_text(title)
+                if name and len(name.split()) <= self.max_words:
+                    self.by_name.setdefault(name, []).append(brand)
+                key = skeleton(title)
+                if len(key) >= 3:
+                    self.by_skeleton.setdefault(key, []).append(brand)
+                for gram in grams(name) | grams(key):
+                    self.by_gram.setdefault(gram, set()).add(i)
+
+    @staticmethod
+    def titles(brand: dict) -> list[str]:
+        return [brand[key] for key in ("title_fa", "title_en") if brand.get(key)]
+
+    @staticmethod
+    def unique(brands: list[dict]) -> list[dict]:
+        return list({id(brand): brand for brand in brands}.values())
+
+    def lookup(self, text: str) -> BrandMatch | None:
+        brands = self.unique(self.by_name.get(normalize_text(text), []))
+        if len(brands) == 1:
+            return BrandMatch(brands[0], 1.0, "exact")
+
+        key = skeleton(text)
+        brands = self.unique(self.by_skeleton.get(key, []))
+        if len(brands) == 1:
+            confidence = 0.9 if len(key) >= self.confident_skeleton else 0.7
+            return BrandMatch(brands[0], confidence, "transliteration")
+
+    def scan(self, text: str) -> BrandMatch | None:
+        """Find brand names that appear as whole word runs inside a title."""
+
+        words = normalize_text(text).split()
+        found: dict[int, tuple[int, dict]] = {}
+        for size in range(self.max_words, 0, -1):
+            for i in range(len(words) - size + 1):
+                for brand in self.by_name.get(" ".join(words[i : i + size]), []):
+                    found.setdefault(id(brand), (size, brand))
+
+        if not found:
+            return None
+        ranked = sorted(found.values(), key=lambda x: x[0], reverse=True)
+        if len(ranked) > 1 and ranked[0][0] == ranked[1][0]:
+            return BrandMatch(None, 0.5, "ambiguous", [b for _, b in ranked])
+        return BrandMatch(ranked[0][1], 0.85 if ranked[0][0] > 1 else 0.8, "title")
+
+    def shortlist(self, name: str) -> list[dict]:
+        """Brands sharing the most title or skeleton trigrams with `name`."""
+
+        shared = Counter()
+        for gram in grams(name) | grams(skeleton(name)):
+            shared.update(self.by_gram.get(gram, ()))
+        return [self.brands[i] for i, _ in shared.most_common(self.fuzzy_pool)]
+
+    def fuzzy(self, text: str, limit: int = 30) -> BrandMatch:
+        name = normalize_text(text)
+        scored = []
+        for brand in self.shortlist(name):
+            score = max(
+                (
+                    similarity(name, normalize_text(title))
+                    for title in self.titles(brand)
+                ),
+                default=0,
+            )
+            scored.append((score, brand))
+
+        scored.sort(key=lambda x: x[0], reverse=True)
+        candidates = [brand for score, brand in scored[:limit] if score > 0.3]
+        if not scored:
+            return BrandMatch(None, 0, "fuzzy")
+        best_score, best = scored[0]
+        margin = best_score - scored[1][0] if len(scored) > 1 else best_score
+        confidence = best_score if margin > 0.1 else best_score * 0.8
+        return BrandMatch(best, round(confidence, 3), "fuzzy", candidates)
+
+    def match(self, product_data) -> BrandMatch:
+        brand_texts = product_brands(product_data)
+        for text in brand_texts:
+            result = self.lookup(text)
+            if result:
+                return result
+
+        result = self.scan(product_query(product_data))
+        if result and result.brand:
+            return result
+
+        candidates = result.candidates if result else []
+        for text in brand_texts:
+            fuzzy = self.fuzzy(text)
+            if fuzzy.brand and (not result or fuzzy.confidence > result.confidence):
+                result = fuzzy
+        if result is None:
+            return BrandMatch(None, 0, "none")
+        result.candidates = self.unique(candidates + result.candidates)
+        return result
+
+    def resolve(self, title: str | None) -> dict | None:
+        if not title:
+            return None
+        result = self.lookup(title)
+        if result:
+            return result.brand
+        result = self.fuzzy(title)
+        if result.confidence >= Settings.BRAND_MATCH_CONFIDENCE:
+            return result.brand
+
+
+brand_indexes: OrderedDict[int, tuple[tuple, BrandIndex]] = OrderedDict()
+
+
+def get_brand_index(category_id: int, brands: list[dict]) -> BrandIndex:
+    fingerprint = tuple(brand.get("id") for brand in brands[:1] + brands[-1:]) + (
+        len(brands),
+    )
+    cached = brand_indexes.get(category_id)
+    if cached and cached[0] == fingerprint:
+        brand_indexes.move_to_end(category_id)
+        return cached[1]
+
+    index = BrandIndex(brands)
+    brand_indexes[category_id] = (fingerprint, index)
+    while len(brand_indexes) > 256:
+        brand_indexes.popitem(last=False)
+    return index
+
+
+def record_match(result: BrandMatch, llm: bool):
+    metrics.observe("brand.confidence", result.confidence)
+    metrics.incr(f"brand.method.{result.method}")
+    metrics.incr("brand.llm" if llm else "brand.local")
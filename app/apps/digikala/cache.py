@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from singleton import Singleton
+
+from server import db
+from server.config import Settings
+from utils.cache import TwoTierCache
+from utils.metrics import metrics
+
+from .digikala import AsyncDGClient
+
+
+class CategoryMetaCache(metaclass=Singleton):
+    """Digikala category validation and attribute data, shared by all sellers.
+
+    Entries older than `DG_CATEGORY_REFRESH` seconds are served as they are
+    and refreshed once in the background, so a popular category never expires
+    under load and concurrent misses share one upstream request.
+    """
+
+    usage_key = "dg_category:usage"
+    kinds = ["details", "attributes"]
+
+    def __init__(self):
+        self.cache = TwoTierCache(
+            "dg_category",
+            ttl=Settings.DG_CATEGORY_TTL,
+            maxsize=4096,
+            redis=db.redis,
+        )
+        self.usage = Counter()
+        self.refreshing: dict[str, asyncio.Task] = {}
+
+    async def fetch(self, kind: str, category_id) -> dict:
+        client = AsyncDGClient()
+        start = time.perf_counter()
+        if kind == "details":
+            data = await client.get_category_details(category_id)
+        else:
+            data = await client.get_category_attribute(category_id)
+        metrics.observe("dg_category.fetch_seconds", time.perf_counter() - start)
+        return {"fetched_at": time.time(), "data": data}
+
+    async def refresh(self, kind: str, category_id):
+        key = f"{kind}:{category_id}"
+        try:
+            await self.cache.get_or_set(
+                key, lambda: self.fetch(kind, category_id), refresh=True
+            )
+            metrics.incr("dg_category.refresh")
+        except Exception as e:
+            logging.warning(f"category cache refresh {key} failed: {e}")
+        finally:
+            self.refreshing.pop(key, None)
+
+    async def get(self, kind: str, category_id, refresh: bool = False):
+        key = f"{kind}:{category_id}"
+        self.usage[category_id] += 1
+        entry = await self.cache.get_or_set(
+            key, lambda: self.fetch(kind, category_id), refresh=refresh
+        )
+
+        age = time.time() - entry["fetched_at"]
+        metrics.observe("dg_category.staleness_seconds", age)
+        if age > Settings.DG_CATEGORY_REFRESH and key not in self.refreshing:
+            self.refreshing[key] = asyncio.create_task(self.refresh(kind, category_id))
+        return entry["data"]
+
+    async def details(self, category_id) -> dict:
+        return await self.get("details", category_id)
+
+    async def attributes(self, category_id) -> list[dict]:
+        return await self.get("attributes", category_id)
+
+    async def brands(self, category_id) -> list[dict]:
+        details = await self.details(category_id)
+        return details.get("data").get("bind").get("brands")
+
+    async def flush_usage(self):
+        """Add the usage counted in this process to the shared Redis ranking.
+
+        Runs every `DG_CATEGORY_USAGE_FLUSH` seconds and at shutdown, counts
+        that fail to reach Redis are kept for the next flush.
+        """
+
+        usage, self.usage = self.usage, Counter()
+        if not usage:
+            return
+        try:
+            async with db.redis.pipeline() as pipe:
+                for category_id, count in usage.items():
+                    pipe.zincrby(self.usage_key, count, category_id)
+                await pipe.execute()
+        except Exception as e:
+            logging.warning(f"category usage flush failed: {e}")
+            self.usage.update(usage)
+
+    async def top_categories(self, limit: int) -> list[int]:
+        ids = await db.redis.zrevrange(self.usage_key, 0, limit - 1)
+        return [int(category_id) for category_id in ids]
+
+    def stats(self) -> dict:
+        return self.cache.stats() | {
+            "staleness": metrics.summary("dg_category.staleness_seconds"),
+            "refreshing": len(self.refreshing),
+        }
+
+
+async def flush_category_usage():
+    await CategoryMetaCache().flush_usage()
+
+
+async def warm_category_cache(limit: int | None = None, concurrency: int = 4):
+    cache = CategoryMetaCache()
+    await cache.flush_usage()
+    category_ids = await cache.top_categories(limit or Settings.DG_CATEGORY_WARMUP)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(category_id):
+        async with semaphore:
+            for kind in cache.kinds:
+                await cache.refresh(kind, category_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[warm(category_id) for category_id in category_ids])
+    logging.info(
+        f"Warmed {len(category_ids)} categories in {time.perf_counter() - start:.1f}s"
+    )
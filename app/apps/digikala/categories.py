@@ -0,0 +1,211 @@
+import dataclasses
+import math
+import re
+from collections import Counter, defaultdict
+
+from singleton import Singleton
+
+from server.config import Settings
+from utils.texttools import normalize_text
+
+persian_pattern = re.compile("[\u0600-\u06ff]")
+query_keys = {
+    "title",
+    "title_fa",
+    "title_en",
+    "name",
+    "brand",
+    "category",
+    "breadcrumb",
+    "breadCrumbs",
+}
+
+
+def product_query(product_data, depth: int = 4) -> str:
+    """Collect the title, brand and breadcrumb strings of a product payload."""
+
+    parts = []
+
+    def walk(data, level, selected=False):
+        if level > depth:
+            return
+        if isinstance(data, dict):
+            for key, value in data.items():
+                walk(value, level + 1, key in query_keys)
+        elif isinstance(data, list):
+            for value in data[:10]:
+                walk(value, level, selected)
+        elif selected and isinstance(data, (str, int, float)):
+            parts.append(str(data))
+
+    walk(product_data, 0, isinstance(product_data, str))
+    return " ".join(parts)[:1000]
+
+
+def text_features(text: str, ngram: int = 3) -> Counter:
+    features = Counter()
+    for word in normalize_text(text).split():
+        features[f"w:{word}"] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - ngram + 1):
+            features[padded[i : i + ngram]] += 1
+    return features
+
+
+class CategoryIndex(metaclass=Singleton):
+    """TF-IDF index of character n-grams over the full category paths."""
+
+    def __init__(self):
+        self.items: list[dict] = Settings().category_list
+
+        self.by_title = {self.path(item): item for item in self.items}
+
+        docs = [
+            text_features(f"{item.get('title')} {item.get('category')}")
+            for item in self.items
+        ]
+        df = Counter(feature for doc in docs for feature in doc)
+        self.idf = {
+            feature: math.log((1 + len(docs)) / (1 + count)) + 1
+            for feature, count in df.items()
+        }
+
+        self.postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        for i, doc in enumerate(docs):
+            for feature, weight in self.vector(doc).items():
+                self.postings[feature].append((i, weight))
+
+    @staticmethod
+    def path(item: dict) -> str:
+        return item.get("title", "").strip().removeprefix(">").strip()
+
+    def vector(self, features: Counter) -> dict[str, float]:
+        vector = {
+            feature: (1 + math.log(count)) * self.idf[feature]
+            for feature, count in features.items()
+            if feature in self.idf
+        }
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1
+        return {feature: w / norm for feature, w in vector.items()}
+
+    def search(self, query: str, k: int = 30) -> list[tuple[dict, float]]:
+        scores = defaultdict(float)
+        for feature, weight in self.vector(text_features(query)).items():
+            for i, doc_weight in self.postings.get(feature, []):
+                scores[i] += weight * doc_weight
+
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(self.items[i], score) for i, score in best]
+
+    def shortlist(self, product_data, k: int = None) -> list[str]:
+        """Top `k` category paths, or `[]` when the full list should be used.
+
+        The category titles are Persian, so a query without Persian words
+        (English-only Amazon titles) only matches the few Latin names by
+        chance. The shortlist is also dropped when fewer than `k` paths match
+        or when the best one does not stand out from the last by at least
+        `CATEGORY_MIN_MARGIN` of its score.
+        """
+
+        if k is None:
+            k = Settings.CATEGORY_SHORTLIST_SIZE
+
+        query = product_query(product_data)
+        if not persian_pattern.search(query):
+            return []
+
+        results = self.search(query, k)
+        if len(results) < k:
+            return []
+        best, last = results[0][1], results[-1][1]
+        if best <= 0 or (best - last) / best < Settings.CATEGORY_MIN_MARGIN:
+            return []
+        return [self.path(item) for item, _ in results]
+
+    def resolve(self, category: dict | str) -> dict:
+        if isinstance(category, dict):
+            category = category.get("category")
+        item = self.by_title.get(str(category).strip().removeprefix(">").strip())
+        if item:
+            return item
+        return Settings().get_category_data(category)
+
+
+@dataclasses.dataclass(eq=False)
+class CategoryNode:
+    name: str
+    path: str = ""
+    depth: int = 0
+    parent: "CategoryNode | None" = None
+    children: dict[str, "CategoryNode"] = dataclasses.field(default_factory=dict)
+    item: dict | None = None
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.children
+
+
+class CategoryTree(metaclass=Singleton):
+    """Trie of the category hierarchy built from the ` > ` separated titles."""
+
+    def __init__(self):
+        self.root = CategoryNode(name="")
+        self.by_id: dict[int, CategoryNode] = {}
+        self.by_name: dict[str, list[CategoryNode]] = defaultdict(list)
+        self.by_path: dict[str, CategoryNode] = {"": self.root}
+
+        for item in CategoryIndex().items:
+            node = self.root
+            for name in CategoryIndex.path(item).split(" > "):
+                if name not in node.children:
+                    child = CategoryNode(
+                        name=name,
+                        path=f"{node.path} > {name}" if node.path else name,
+                        depth=node.depth + 1,
+                        parent=node,
+                    )
+                    node.children[name] = child
+                    self.by_path[child.path] = child
+                    self.by_name[normalize_text(name)].append(child)
+                node = node.children[name]
+            node.item = item
+            self.by_id[item.get("id")] = node
+
+    def get(self, category_id: int) -> CategoryNode | None:
+        return self.by_id.get(category_id)
+
+    def find(self, name: str) -> list[CategoryNode]:
+        return self.by_name.get(normalize_text(name), [])
+
+    def prefix(self, path: str) -> CategoryNode | None:
+        node = self.by_path.get(path.strip().removeprefix(">").strip())
+        if node:
+            return node
+
+        node = self.root
+        for name in path.strip().removeprefix(">").split(">"):
+            node = node.children.get(name.strip())
+            if node is None:
+                return None
+        return node
+
+    def leaves(self, node: CategoryNode) -> list[CategoryNode]:
+        if node.is_leaf:
+            return [node]
+        return [leaf for child in node.children.values() for leaf in self.leaves(child)]
+
+    @staticmethod
+    def choose(node: CategoryNode, answer) -> CategoryNode | None:
+        if isinstance(answer, dict):
+            answer = answer.get("category")
+        if answer is None:
+            return None
+
+        answer = str(answer).split(">")[-1].strip()
+        if answer in node.children:
+            return node.children[answer]
+
+        normalized = normalize_text(answer)
+        for name, child in node.children.items():
+            if normalize_text(name) == normalized:
+                return child
@@ -1,8 +1,41 @@
+import asyncio
+import logging
 import random
+import re
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
 from singleton import Singleton
+from urllib3.util.retry import Retry
+
+from server.config import Settings
+
+retry_statuses = [429, 500, 502, 503, 504]
+idempotent_methods = frozenset(Retry.DEFAULT_ALLOWED_METHODS)
+product_id_pattern = re.compile(r"dkp-(\d+)", re.IGNORECASE)
+
+
+def get_product_id(url: str) -> str:
+    # url = 'https://www.digikala.com/product/dkp-10797167/sadlkjalkd-fasfn'
+    match = product_id_pattern.search(url)
+    if match:
+        return match.group(1)
+    return url.split("/")[4].split("-")[1]
+
+
+class DGRetry(Retry):
+    """Retries idempotent methods, other methods (POST) only on a 429.
+
+    Connection errors before the request was sent are retried for any method.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
 
 
 class DGClient(metaclass=Singleton):
@@ -105,16 +138,40 @@ class DGClient(metaclass=Singleton):
             "/lightening-deal/bids/{bidId}/payment-method",
         ]
 
+        self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            retry = DGRetry(
+                total=Settings.DG_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=retry_statuses,
+                allowed_methods=idempotent_methods,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_maxsize=Settings.DG_CONCURRENCY, max_retries=retry
+            )
+            self._session = requests.Session()
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
     def _request(self, method, url=None, status_code="200", **kwargs):
         if url is None:
             path = kwargs.pop("path")
             url = self.get_route(path)
 
-        headers = kwargs.get("headers", {})
+        headers = kwargs.pop("headers", {})
         headers["x-response-code"] = status_code
         headers["content-type"] = "application/json"
+        kwargs.setdefault("timeout", Settings.DG_TIMEOUT)
 
-        response = requests.request(method=method, url=url, headers=headers, **kwargs)
+        response = self.session.request(
+            method=method, url=url, headers=headers, **kwargs
+        )
         response.raise_for_status()
         return response.json()
 
@@ -189,9 +246,11 @@ class DGClient(metaclass=Singleton):
         return attributes
 
     def get_product_details(self, url):
-        # url = 'https://www.digikala.com/product/dkp-10797167/sadlkjalkd-fasfn'
-        pid = url.split("/")[4].split("-")[1]
-        return requests.get(f"https://api.digikala.com/v2/product/{pid}/").json()
+        pid = get_product_id(url)
+        response = self.session.get(
+            f"https://api.digikala.com/v2/product/{pid}/", timeout=Settings.DG_TIMEOUT
+        )
+        return response.json()
     
     def save_product(self, product_data):
         path = "/product-creation​/product​/detail​/validation"
@@ -201,3 +260,146 @@ class DGClient(metaclass=Singleton):
         draft = self._request("post", path=path, json={"draft_product_id": draft.get("data").get("draft_product_id"), **product_data})
 
         return draft
+
+
+class AsyncDGClient(DGClient):
+    """Async Digikala client on a shared keep-alive connection pool.
+
+    Every request has a timeout and is capped per host. Idempotent requests
+    are retried with jittered exponential backoff on 429/5xx and connection
+    errors. Other methods, such as the POST of a product draft, are retried
+    only on a 429 or when the connection failed before anything was sent.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._aio_session: aiohttp.ClientSession | None = None
+        self.host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def aio_session(self) -> aiohttp.ClientSession:
+        if self._aio_session is None or self._aio_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=Settings.DG_CONCURRENCY * 4,
+                limit_per_host=Settings.DG_CONCURRENCY,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._aio_session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=Settings.DG_TIMEOUT),
+            )
+        return self._aio_session
+
+    async def close(self):
+        if self._aio_session is not None and not self._aio_session.closed:
+            await self._aio_session.close()
+
+    def host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(Settings.DG_CONCURRENCY)
+        return self.host_semaphores[host]
+
+    @staticmethod
+    def backoff(attempt: int, retry_after: str | None = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return 0.5 * 2**attempt * random.uniform(0.5, 1.5)
+
+    async def _request(self, method, url=None, status_code="200", **kwargs):
+        if url is None:
+            path = kwargs.pop("path")
+            url = self.get_route(path)
+
+        headers = kwargs.pop("headers", {})
+        headers["x-response-code"] = status_code
+        headers["content-type"] = "application/json"
+        timeout = kwargs.pop("timeout", Settings.DG_TIMEOUT)
+        idempotent = method.upper() in idempotent_methods
+        statuses = retry_statuses if idempotent else [429]
+
+        for attempt in range(Settings.DG_RETRIES + 1):
+            last_attempt = attempt == Settings.DG_RETRIES
+            try:
+                async with self.host_semaphore(url):
+                    async with self.aio_session.request(
+                        method,
+                        url,
+                        headers=headers,
+                        timeout=aiohttp.ClientTimeout(total=timeout),
+                        **kwargs,
+                    ) as response:
+                        if response.status in statuses and not last_attempt:
+                            delay = self.backoff(
+                                attempt, response.headers.get("Retry-After")
+                            )
+                            logging.warning(
+                                f"Digikala {response.status} on {url}, retry in {delay:.1f}s"
+                            )
+                        else:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                if last_attempt or (sent and not idempotent):
+                    raise
+                delay = self.backoff(attempt)
+                logging.warning(f"Digikala {e!r} on {url}, retry in {delay:.1f}s")
+
+            await asyncio.sleep(delay)
+
+    async def get_auth(self, token):
+        path = "auth/token"
+        res = await self._request(
+            "POST", path=path, json={"authorization_code": token}
+        )
+        return res.get("data")
+
+    async def get_orders(self, from_date: datetime) -> list:
+        path = "orders"
+        await self._request(method="get", path=path)
+        orders = [
+            self.generate_random_order()
+            for _ in range(random.choices([1, 2, 3], [0.5, 0.3, 0.2])[0])
+        ]
+        return [
+            order
+            for order in orders
+            if datetime.fromisoformat(order["order_created_at"]) > from_date
+        ]
+
+    async def get_category_details(self, category_id):
+        path = f"product-creation/category/{category_id}/validation"
+        return await self._request(method="get", path=path)
+
+    async def get_category_attribute(self, category_id):
+        path = f"product-creation/attributes/{category_id}"
+        r = await self._request(method="get", path=path)
+        attr_groups = r.get("data").get("category_group_attributes")
+
+        attributes = []
+        for attrs in attr_groups.values():
+            attributes += list(attrs.get("attributes").values())
+
+        return attributes
+
+    async def get_product_details(self, url):
+        pid = get_product_id(url)
+        return await self._request(
+            method="get", url=f"https://api.digikala.com/v2/product/{pid}/"
+        )
+
+    async def save_product(self, product_data):
+        path = "product-creation/product/detail/validation"
+        draft = await self._request("post", path=path, json=product_data)
+
+        path = "product-creation/auto-title/save"
+        return await self._request(
+            "post",
+            path=path,
+            json={
+                "draft_product_id": draft.get("data").get("draft_product_id"),
+                **product_data,
+            },
+        )
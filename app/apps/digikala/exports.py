@@ -0,0 +1,143 @@
+import csv
+import dataclasses
+import hashlib
+import io
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+from singleton import Singleton
+
+from server.config import Settings
+from utils.metrics import metrics
+
+media_types = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+name_pattern = re.compile(r"^[0-9a-f]{32}\.(xlsx|csv)$")
+xlsx_title_pattern = re.compile(r"[\[\]:*?/\\]")
+
+
+def rows(df: pd.DataFrame):
+    if not len(df.columns):
+        return
+    yield df.columns.tolist()
+    yield from df.itertuples(index=False, name=None)
+
+
+def write_xlsx(f, worksheets: dict[str, pd.DataFrame]):
+    workbook = Workbook(write_only=True)
+    used = set()
+    for worksheet_name, df in worksheets.items():
+        title = xlsx_title_pattern.sub(" ", worksheet_name)[:31] or "Sheet"
+        if title in used:
+            title = f"{title[:27]} {len(used)}"
+        used.add(title)
+
+        worksheet = workbook.create_sheet(title=title)
+        for row in rows(df):
+            worksheet.append(list(row))
+    workbook.save(f)
+
+
+def write_csv(f, worksheets: dict[str, pd.DataFrame]):
+    """Write all worksheets as one table, with a `worksheet` column if there are several."""
+
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    if len(worksheets) > 1:
+        df = pd.concat(
+            [df.assign(worksheet=name) for name, df in worksheets.items()],
+            ignore_index=True,
+        ).fillna("")
+        df = df[["worksheet"] + [c for c in df.columns if c != "worksheet"]]
+    else:
+        df = next(iter(worksheets.values()), pd.DataFrame())
+
+    writer = csv.writer(text)
+    for row in rows(df):
+        writer.writerow(row)
+    text.flush()
+    text.detach()
+
+
+writers = {"xlsx": write_xlsx, "csv": write_csv}
+
+
+@dataclasses.dataclass
+class Export:
+    name: str
+    data: bytes | None = None
+    path: Path | None = None
+
+    @property
+    def media_type(self) -> str:
+        return media_types[self.name.rsplit(".", 1)[-1]]
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else self.path.stat().st_size
+
+    @property
+    def etag(self) -> str:
+        if self.data is not None:
+            return f'"{hashlib.sha1(self.data).hexdigest()}"'
+        stat = self.path.stat()
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def read(self, start: int = 0, end: int | None = None) -> bytes:
+        """Bytes from `start` up to and including `end`."""
+
+        if self.data is not None:
+            return self.data[start : None if end is None else end + 1]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(-1 if end is None else end - start + 1)
+
+
+class ExportStore(metaclass=Singleton):
+    """Spreadsheet exports on local disk, or in memory for the `memory` backend."""
+
+    max_memory_exports = 64
+
+    def __init__(self):
+        self.directory = Path(Settings.SHEET_EXPORT_DIR)
+        self.memory: OrderedDict[str, bytes] = OrderedDict()
+
+    @staticmethod
+    def url(name: str) -> str:
+        return f"https://{Settings.root_url}/sheets/exports/{name}"
+
+    def save(self, worksheets: dict[str, pd.DataFrame], backend: str = "xlsx") -> dict:
+        start = time.perf_counter()
+        extension = Settings.SHEET_EXPORT_FORMAT if backend == "memory" else backend
+        name = f"{uuid.uuid4().hex}.{extension}"
+
+        if backend == "memory":
+            buffer = io.BytesIO()
+            writers[extension](buffer, worksheets)
+            self.memory[name] = buffer.getvalue()
+            while len(self.memory) > self.max_memory_exports:
+                self.memory.popitem(last=False)
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / name, "wb") as f:
+                writers[extension](f, worksheets)
+
+        metrics.observe("sheet.export_seconds", time.perf_counter() - start)
+        logging.info(f"Sheet exported as {name}")
+        return {"spreadsheetId": name, "url": self.url(name)}
+
+    def get(self, name: str) -> Export | None:
+        if not name_pattern.match(name):
+            return None
+        if name in self.memory:
+            return Export(name=name, data=self.memory[name])
+        path = self.directory / name
+        if path.exists():
+            return Export(name=name, path=path)
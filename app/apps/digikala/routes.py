@@ -0,0 +1,73 @@
+import asyncio
+import re
+
+import fastapi
+from fastapi import APIRouter
+
+from core.exceptions import BaseHTTPException
+
+from .exports import ExportStore
+
+router = APIRouter(prefix="/sheets", tags=["sheets"])
+
+range_pattern = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Single `bytes=` range as inclusive offsets.
+
+    An invalid header is ignored (`None`, the full body is served), a valid
+    range that starts past the end raises 416.
+    """
+
+    match = range_pattern.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        start, end = max(size - int(end), 0), size - 1 if int(end) else -1
+    elif end and int(end) < int(start):
+        return None
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise BaseHTTPException(
+            status_code=416,
+            error="range_not_satisfiable",
+            message=f"bytes */{size}",
+        )
+    return start, end
+
+
+@router.get("/exports/{name}")
+async def get_export(name: str, request: fastapi.Request):
+    export = ExportStore().get(name)
+    if export is None:
+        raise BaseHTTPException(
+            status_code=404, error="export_not_found", message="Export not found"
+        )
+
+    size, etag = await asyncio.to_thread(lambda: (export.size, export.etag))
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{name}"',
+        "Cache-Control": "private, max-age=3600",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return fastapi.Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is None:
+        content = await asyncio.to_thread(export.read)
+        return fastapi.Response(content, media_type=export.media_type, headers=headers)
+
+    start, end = byte_range
+    content = await asyncio.to_thread(export.read, start, end)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return fastapi.Response(
+        content, status_code=206, media_type=export.media_type, headers=headers
+    )
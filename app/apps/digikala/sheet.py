@@ -1,100 +1,414 @@
-import logging
+import dataclasses
+import hashlib
 import json
-from functools import lru_cache
+import logging
+import numbers
+import threading
+import time
+import uuid
 
 import gspread
 import pandas as pd
+from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from gspread_dataframe import get_as_dataframe, set_with_dataframe
+from gspread_dataframe import get_as_dataframe
 
+from server import db
 from server.config import Settings
+from utils.metrics import metrics
+
+from .exports import ExportStore
+
+scopes = [
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/drive.file",
+    # "https://www.googleapis.com/auth/drive.permissions",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://spreadsheets.google.com/feeds",
+]
+
+
+class GoogleClients:
+    """Service account credentials and API clients kept for the process lifetime.
+
+    The access token is minted once and refreshed only when it expires.
+    Discovery based services are not thread safe, so each worker thread
+    builds its own Sheets, Drive and gspread clients once and reuses them.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self._credentials: service_account.Credentials | None = None
+
+    @property
+    def credentials(self) -> service_account.Credentials:
+        with self.lock:
+            if self._credentials is None:
+                self._credentials = self.loader().with_scopes(scopes)
+            if not self._credentials.valid:
+                self._credentials.refresh(Request())
+                metrics.incr("google.token_refresh")
+            return self._credentials
+
+    def client(self, name: str):
+        client = getattr(self.local, name, None)
+        if client is None:
+            credentials = self.credentials
+            if name == "gspread":
+                client = gspread.authorize(credentials)
+            else:
+                version = {"sheets": "v4", "drive": "v3"}[name]
+                client = build(
+                    name, version, credentials=credentials, cache_discovery=False
+                )
+            setattr(self.local, name, client)
+        return client
+
+    @property
+    def sheets(self):
+        return self.client("sheets")
+
+    @property
+    def drive(self):
+        return self.client("drive")
+
+    @property
+    def gspread(self) -> gspread.Client:
+        return self.client("gspread")
+
+
+google_clients = GoogleClients(
+    lambda: service_account.Credentials.from_service_account_file(
+        Settings.base_dir / "scripts" / "dgyar-access.json"
+    )
+)
+# credentials of the template spreadsheet read by `get_sheet_data`
+secret_clients = GoogleClients(
+    lambda: service_account.Credentials.from_service_account_info(
+        json.loads(Settings.GOOGLE_SECRET)
+    )
+)
+
+
+template_spreadsheet_id = "1sWOYcFiMFY0cxNBvK6Uc96exT7ZXhR5dpV6DnB1kcaQ"
+
+
+@dataclasses.dataclass
+class CachedRead:
+    value: object
+    revision: str | None
+    loaded_at: float
+
+
+class SheetReadCache:
+    """Reads keyed by spreadsheet id and worksheet, reloaded only on change.
+
+    An entry is trusted for `SHEET_CACHE_TTL` seconds as long as the Drive
+    `modifiedTime` of its spreadsheet still matches the one seen at load.
+    The revision is asked at most once per `SHEET_CACHE_CHECK_INTERVAL`
+    for all worksheets of a spreadsheet. Write paths call `invalidate`.
+    """
+
+    def __init__(self, clients: GoogleClients):
+        self.clients = clients
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[str, str | None], CachedRead] = {}
+        self.revisions: dict[str, tuple[str | None, float]] = {}
+
+    def revision(self, spreadsheet_id: str) -> str | None:
+        with self.lock:
+            cached = self.revisions.get(spreadsheet_id)
+        if (
+            cached
+            and time.monotonic() - cached[1] < Settings.SHEET_CACHE_CHECK_INTERVAL
+        ):
+            return cached[0]
+
+        try:
+            revision = (
+                self.clients.drive.files()
+                .get(fileId=spreadsheet_id, fields="modifiedTime")
+                .execute()
+                .get("modifiedTime")
+            )
+        except Exception as e:
+            logging.warning(f"sheet revision check of {spreadsheet_id} failed: {e}")
+            revision = cached[0] if cached else None
+        with self.lock:
+            self.revisions[spreadsheet_id] = (revision, time.monotonic())
+        return revision
+
+    def get(self, spreadsheet_id: str, worksheet_name: str | None, loader):
+        key = (spreadsheet_id, worksheet_name)
+        with self.lock:
+            entry = self.entries.get(key)
+
+        revision = self.revision(spreadsheet_id)
+        if entry and time.monotonic() - entry.loaded_at < Settings.SHEET_CACHE_TTL:
+            if entry.revision == revision:
+                metrics.incr("sheet_cache.hit")
+                return entry.value
+            metrics.incr("sheet_cache.changed")
+        else:
+            metrics.incr("sheet_cache.miss")
 
+        value = loader()
+        with self.lock:
+            self.entries[key] = CachedRead(value, revision, time.monotonic())
+        return value
 
-@lru_cache
-def get_sheet_data(spreadsheet_id="1sWOYcFiMFY0cxNBvK6Uc96exT7ZXhR5dpV6DnB1kcaQ"):
-    scopes = [
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/drive.file",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://spreadsheets.google.com/feeds",
-    ]
-    # credentials = service_account.Credentials.from_service_account_file(
-    #     base_dir / "secrets" / "snappshop-access.json", scopes=scopes
-    # )
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(Settings.GOOGLE_SECRET), scopes=scopes
-    )
+    def invalidate(self, spreadsheet_id: str, worksheet_name: str | None = None):
+        with self.lock:
+            self.revisions.pop(spreadsheet_id, None)
+            for key in list(self.entries):
+                if key[0] == spreadsheet_id and (
+                    worksheet_name is None or key[1] in (worksheet_name, None)
+                ):
+                    del self.entries[key]
 
-    gc = gspread.authorize(credentials)
 
-    wb = gc.open_by_key(spreadsheet_id)
-    return wb
+sheet_read_cache = SheetReadCache(secret_clients)
 
 
-def g_credentials() -> service_account.Credentials:
-    scopes = [
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/drive.file",
-        # "https://www.googleapis.com/auth/drive.permissions",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://spreadsheets.google.com/feeds",
-    ]
-    logging.info(scopes)
-    credentials = service_account.Credentials.from_service_account_file(
-        Settings.base_dir / "scripts" / "dgyar-access.json", scopes=scopes
+def get_sheet_data(spreadsheet_id=template_spreadsheet_id):
+    return sheet_read_cache.get(
+        spreadsheet_id,
+        None,
+        lambda: secret_clients.gspread.open_by_key(spreadsheet_id),
     )
-    return credentials
-    # credentials = service_account.Credentials.from_service_account_info(
-    #     json.loads(Settings.GOOGLE_SECRET), scopes=scopes
-    # )
-    service = build("sheets", "v4", credentials=credentials)
-    return service
 
 
-def create_sheet():
-    service = build("sheets", "v4", credentials=g_credentials())
-    spreadsheet = {"properties": {"title": "Product Data"}}
+def g_credentials() -> service_account.Credentials:
+    return google_clients.credentials
+
+
+def cell_data(value) -> dict:
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, numbers.Number):
+        if not isinstance(value, (int, float)):
+            value = float(value)
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def worksheet_values(df: pd.DataFrame) -> list[list]:
+    if not len(df.columns):
+        return []
+    return [df.columns.tolist()] + df.values.tolist()
+
+
+def worksheet_properties(sheet_id: int, title: str, values: list[list]) -> dict:
+    return {
+        "sheetId": sheet_id,
+        "title": title,
+        "gridProperties": {
+            "rowCount": max(len(values), 1000),
+            "columnCount": max(len(values[0]) if values else 0, 26),
+        },
+    }
+
+
+def row_data(values: list[list]) -> list[dict]:
+    return [{"values": [cell_data(value) for value in row]} for row in values]
+
+
+def worksheet_body(sheet_id: int, title: str, df: pd.DataFrame) -> dict:
+    values = worksheet_values(df)
+    return {
+        "properties": worksheet_properties(sheet_id, title, values),
+        "data": [{"startRow": 0, "startColumn": 0, "rowData": row_data(values)}],
+    }
+
+
+def create_spreadsheet(
+    worksheets: dict[str, pd.DataFrame], title: str = "Product Data"
+) -> dict:
+    """Create a filled spreadsheet and share it, in two API requests.
+
+    The first worksheet gets gid 0, which `get_sheet_url` links to.
+    """
+
+    start = time.perf_counter()
+    body = {
+        "properties": {"title": title},
+        "sheets": [
+            worksheet_body(i, worksheet_name, df)
+            for i, (worksheet_name, df) in enumerate(worksheets.items())
+        ],
+    }
     spreadsheet = (
-        service.spreadsheets()
-        .create(body=spreadsheet, fields="spreadsheetId")
+        google_clients.sheets.spreadsheets()
+        .create(body=body, fields="spreadsheetId")
         .execute()
     )
-
     spreadsheet_id = spreadsheet.get("spreadsheetId")
 
-    print(f"Spreadsheet ID: {spreadsheet_id}")
-
-    drive_service = build("drive", "v3", credentials=g_credentials())
-
     public_permissions = {
         "type": "anyone",  # Allows anyone with the link to access
         "role": "writer",  # or 'writer' if you want public edit access
     }
-    res = drive_service.permissions().create(
+    google_clients.drive.permissions().create(
         fileId=spreadsheet_id,
         body=public_permissions,
         fields="id",
     ).execute()
-    logging.info(f"Sheet created with ID: {spreadsheet_id} {res}")
-
-    # permissions = {
-    #     "type": "user",  # You can also set this to 'anyone' if you want public access
-    #     "role": "writer",  # or 'reader'
-    #     "emailAddress": "mahdikiany@gmail.com",
-    # }
-    # drive_service.permissions().create(
-    #     fileId=spreadsheet_id,
-    #     body=permissions,
-    #     fields="id",
-    # ).execute()
+
+    metrics.observe("sheet.create_seconds", time.perf_counter() - start)
+    logging.info(f"Sheet created with ID: {spreadsheet_id}")
     return spreadsheet
 
 
+def fill_spreadsheet(
+    spreadsheet_id: str,
+    worksheets: dict[str, pd.DataFrame],
+    title: str = "Product Data",
+):
+    """Rename an empty pooled spreadsheet and write its worksheets in one request."""
+
+    start = time.perf_counter()
+    requests = [
+        {
+            "updateSpreadsheetProperties": {
+                "properties": {"title": title},
+                "fields": "title",
+            }
+        }
+    ]
+    for i, (worksheet_name, df) in enumerate(worksheets.items()):
+        values = worksheet_values(df)
+        properties = worksheet_properties(i, worksheet_name, values)
+        if i == 0:
+            requests.append(
+                {
+                    "updateSheetProperties": {
+                        "properties": properties,
+                        "fields": "title,gridProperties.rowCount,gridProperties.columnCount",
+                    }
+                }
+            )
+        else:
+            requests.append({"addSheet": {"properties": properties}})
+        if values:
+            requests.append(
+                {
+                    "updateCells": {
+                        "start": {"sheetId": i, "rowIndex": 0, "columnIndex": 0},
+                        "rows": row_data(values),
+                        "fields": "userEnteredValue",
+                    }
+                }
+            )
+
+    google_clients.sheets.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id, body={"requests": requests}
+    ).execute()
+    sheet_read_cache.invalidate(spreadsheet_id)
+    metrics.observe("sheet.fill_seconds", time.perf_counter() - start)
+
+
+class SpreadsheetPool:
+    """Empty, already shared spreadsheets kept ready in a Redis list.
+
+    `LPOP` hands each spreadsheet to exactly one caller, so several server
+    processes can lease from the same pool. Refills take a short Redis lock
+    so only one process tops the pool up at a time.
+    """
+
+    key = "sheet_pool:ready"
+    lock_key = "sheet_pool:refill"
+    lock_ttl = 300
+    # delete the lock only while it still holds our token, a refill that
+    # outlived the ttl must not release the lock of the next one
+    release_script = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, size: int = None):
+        self.size = Settings.SHEET_POOL_SIZE if size is None else size
+        if Settings.SHEET_BACKEND != "google":
+            self.size = 0
+
+    def depth(self) -> int:
+        depth = db.redis_sync.llen(self.key)
+        metrics.gauge("sheet_pool.depth", depth)
+        return depth
+
+    def lease(self) -> str | None:
+        if not self.size:
+            return None
+
+        start = time.perf_counter()
+        try:
+            spreadsheet_id = db.redis_sync.lpop(self.key)
+        except Exception as e:
+            logging.warning(f"sheet pool lease failed: {e}")
+            return None
+        metrics.observe("sheet_pool.lease_seconds", time.perf_counter() - start)
+        if spreadsheet_id is None:
+            metrics.incr("sheet_pool.miss")
+            return None
+
+        metrics.incr("sheet_pool.hit")
+        return spreadsheet_id.decode()
+
+    def refill(self) -> int:
+        if not self.size:
+            return 0
+        token = uuid.uuid4().hex
+        if not db.redis_sync.set(self.lock_key, token, nx=True, ex=self.lock_ttl):
+            return 0
+
+        created = 0
+        start = time.perf_counter()
+        try:
+            while self.depth() < self.size:
+                spreadsheet = create_spreadsheet({"Sheet1": pd.DataFrame()})
+                db.redis_sync.rpush(self.key, spreadsheet.get("spreadsheetId"))
+                metrics.incr("sheet_pool.refilled")
+                created += 1
+        finally:
+            db.redis_sync.eval(self.release_script, 1, self.lock_key, token)
+
+        if created:
+            metrics.observe("sheet_pool.refill_seconds", time.perf_counter() - start)
+            logging.info(f"Added {created} spreadsheets to the pool")
+        return created
+
+
+sheet_pool = SpreadsheetPool()
+
+
+def provide_spreadsheet(
+    worksheets: dict[str, pd.DataFrame], title: str = "Product Data"
+) -> dict:
+    """Fill a pooled spreadsheet, or create one when the pool is empty."""
+
+    spreadsheet_id = sheet_pool.lease()
+    if spreadsheet_id:
+        try:
+            fill_spreadsheet(spreadsheet_id, worksheets, title)
+            return {"spreadsheetId": spreadsheet_id}
+        except Exception as e:
+            logging.warning(f"filling pooled sheet {spreadsheet_id} failed: {e}")
+    return create_spreadsheet(worksheets, title)
+
+
+def create_sheet():
+    return create_spreadsheet({"Sheet1": pd.DataFrame()})
+
+
 def df_to_gsheet(df, spreadsheet, worksheet_name="Sheet1"):
-    client = gspread.authorize(g_credentials())
     spreadsheet_id = spreadsheet.get("spreadsheetId")
-    spreadsheet = client.open_by_key(spreadsheet_id)
+    spreadsheet = google_clients.gspread.open_by_key(spreadsheet_id)
 
     # If the worksheet already exists, clear it, otherwise create a new one
     try:
@@ -110,52 +424,151 @@ def df_to_gsheet(df, spreadsheet, worksheet_name="Sheet1"):
 
     # Update the worksheet with the DataFrame data
     worksheet.update(values)
+    sheet_read_cache.invalidate(spreadsheet_id, worksheet_name)
+    return worksheet
 
 
-@lru_cache
-def get_df(worksheet_name="Sheet1") -> pd.DataFrame:
-    wb = get_sheet_data()
-    sheet = wb.worksheet(worksheet_name)
-    df = get_as_dataframe(sheet)
-    return df
+def get_df(
+    worksheet_name="Sheet1", spreadsheet_id=template_spreadsheet_id
+) -> pd.DataFrame:
+    def load():
+        wb = get_sheet_data(spreadsheet_id)
+        sheet = wb.worksheet(worksheet_name)
+        return get_as_dataframe(sheet)
 
+    return sheet_read_cache.get(spreadsheet_id, worksheet_name, load)
 
-def update_sheet_row(index: int, new_data: dict, worksheet_name="Sheet1"):
-    # Get the worksheet
-    wb = get_sheet_data()
-    sheet = wb.worksheet(worksheet_name)
 
-    # Convert worksheet to dataframe
-    df = get_as_dataframe(sheet)
+class SheetConflictError(Exception):
+    """The header row changed since the caller read it."""
 
-    # Update the dataframe with new data
-    for key, value in new_data.items():
-        if key in df.columns:
-            df.at[index, key] = value
-        else:
-            df[key] = pd.NA
-            df.at[index, key] = value
 
-    # Clear the worksheet and write the updated dataframe back
-    sheet.clear()
-    set_with_dataframe(sheet, df)
+def header_checksum(header: list[str]) -> str:
+    return hashlib.sha1(json.dumps(header, ensure_ascii=False).encode()).hexdigest()
+
+
+def sheet_value(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return str(value)
+
+
+def update_sheet_rows(
+    rows: dict[int, dict],
+    worksheet_name="Sheet1",
+    spreadsheet: gspread.Spreadsheet = None,
+    expected_header: str | None = None,
+) -> str:
+    """Write only the changed cells of several rows in one request.
+
+    `rows` maps dataframe indexes (sheet row `index + 2`) to `{column: value}`.
+    Unknown columns are appended to the header row first and the row is read
+    back before any data cell is sent. When `expected_header` is given and
+    the header no longer has that checksum, or another writer changed it
+    while the columns were appended, `SheetConflictError` is raised before
+    any data is written. Returns the checksum of the header after the update.
+    """
+
+    if spreadsheet is None:
+        spreadsheet = get_sheet_data()
+    worksheet = spreadsheet.worksheet(worksheet_name)
+
+    header = worksheet.row_values(1)
+    if expected_header and header_checksum(header) != expected_header:
+        raise SheetConflictError(f"header of {worksheet_name} changed")
+
+    missing = list(
+        dict.fromkeys(
+            key for data in rows.values() for key in data if key not in header
+        )
+    )
+    columns = {key: i + 1 for i, key in enumerate(header + missing)}
+
+    if missing:
+        if worksheet.col_count < len(columns):
+            worksheet.add_cols(len(columns) - worksheet.col_count)
+        first = gspread.utils.rowcol_to_a1(1, len(header) + 1)
+        last = gspread.utils.rowcol_to_a1(1, len(columns))
+        worksheet.batch_update(
+            [{"range": f"{first}:{last}", "values": [missing]}],
+            value_input_option="RAW",
+        )
+        sheet_read_cache.invalidate(spreadsheet.id, worksheet_name)
+        if worksheet.row_values(1) != header + missing:
+            # another writer appended columns at the same time, no data written
+            raise SheetConflictError(f"concurrent header update on {worksheet_name}")
+
+    max_row = max(rows, default=0) + 2
+    if worksheet.row_count < max_row:
+        worksheet.add_rows(max_row - worksheet.row_count)
+
+    data = []
+    for index, new_data in rows.items():
+        for key, value in new_data.items():
+            cell = gspread.utils.rowcol_to_a1(index + 2, columns[key])
+            data.append({"range": cell, "values": [[sheet_value(value)]]})
+
+    if data:
+        worksheet.batch_update(data, value_input_option="RAW")
+        metrics.incr("sheet.updated_cells", len(data))
+    sheet_read_cache.invalidate(spreadsheet.id, worksheet_name)
+    return header_checksum(header + missing)
+
+
+def update_sheet_row(index: int, new_data: dict, worksheet_name="Sheet1"):
+    update_sheet_rows({index: new_data}, worksheet_name)
 
 
 def get_sheet_url(sheet_id: dict | str):
     if type(sheet_id) == dict:
+        if sheet_id.get("url"):
+            return sheet_id.get("url")
         sheet_id = sheet_id.get("spreadsheetId")
     return f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit?gid=0#gid=0"
 
 
 def get_sheet_id(sheet_url: str):
+    if "docs.google.com" not in sheet_url:
+        return sheet_url.rstrip("/").split("/")[-1]
     return sheet_url.split("/")[5]
 
 
 def create_sheet_df(data):
-    df = pd.DataFrame(data)
-    sheet = create_sheet()
-    df_to_gsheet(df, sheet)
-    return sheet
+    return create_sheet_dfs({"Sheet1": data})
+
+
+def export_spreadsheet(backend: str):
+    def export(worksheets: dict[str, pd.DataFrame]) -> dict:
+        return ExportStore().save(worksheets, backend)
+
+    return export
+
+
+sheet_backends = {
+    "google": provide_spreadsheet,
+    "xlsx": export_spreadsheet("xlsx"),
+    "csv": export_spreadsheet("csv"),
+    "memory": export_spreadsheet("memory"),
+}
+
+
+def create_sheet_dfs(worksheets: dict[str, list[dict]]):
+    """Create one spreadsheet with a worksheet for each `{name: rows}` item.
+
+    `SHEET_BACKEND` picks Google Sheets or a local xlsx/csv/in-memory export
+    served by the `/sheets/exports` route.
+    """
+
+    return sheet_backends[Settings.SHEET_BACKEND](
+        {
+            worksheet_name: pd.DataFrame(data).fillna("")
+            for worksheet_name, data in worksheets.items()
+        }
+    )
 
 
 if __name__ == "__main__":
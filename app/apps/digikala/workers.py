@@ -1,5 +1,13 @@
+import asyncio
+
 from apps.accounts.models import Profile
 
+from .sheet import sheet_pool
+
 
 async def check_new_notifications():
     await Profile.find().to_list()
+
+
+async def refill_sheet_pool():
+    await asyncio.to_thread(sheet_pool.refill)
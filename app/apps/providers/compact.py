@@ -0,0 +1,146 @@
+import json
+import logging
+import re
+
+from server.config import Settings
+from utils.metrics import metrics
+
+noise_pattern = re.compile(
+    r"(url|urls|image|images|thumbnail|logo|icon|link|links|webp)$", re.IGNORECASE
+)
+html_pattern = re.compile(r"<[^>]+>")
+space_pattern = re.compile(r"\s+")
+max_list_items = 50
+
+
+def dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def product_text(product_data) -> str:
+    """Prompt form of a product, compact json for dicts and lists."""
+
+    if isinstance(product_data, (dict, list)):
+        return dumps(product_data)
+    return str(product_data)
+
+
+def lookup(data, path: str):
+    for key in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def prune(value):
+    """Drop empty values and media/link fields, strip html and extra spaces."""
+
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            if noise_pattern.search(str(key)):
+                continue
+            item = prune(item)
+            if item not in (None, "", [], {}):
+                pruned[key] = item
+        return pruned
+    if isinstance(value, list):
+        items = [prune(item) for item in value[:max_list_items]]
+        return [item for item in items if item not in (None, "", [], {})]
+    if isinstance(value, str):
+        return space_pattern.sub(" ", html_pattern.sub(" ", value)).strip()
+    return value
+
+
+def fit(value, budget: int):
+    """Cut a value down to about `budget` serialized characters."""
+
+    if len(dumps(value)) <= budget:
+        return value
+    if isinstance(value, str):
+        return value[: max(budget - 3, 0)]
+    if isinstance(value, list):
+        items, used = [], 2
+        for item in value:
+            size = len(dumps(item)) + 1
+            if used + size > budget:
+                item = fit(item, budget - used - 1)
+                if item not in (None, "", [], {}):
+                    items.append(item)
+                break
+            items.append(item)
+            used += size
+        return items
+    if isinstance(value, dict):
+        items, used = {}, 2
+        for key, item in value.items():
+            size = len(dumps({key: item}))
+            if used + size > budget:
+                item = fit(item, budget - used - len(dumps(key)) - 1)
+                if item not in (None, "", [], {}):
+                    items[key] = item
+                break
+            items[key] = item
+            used += size
+        return items
+    return None
+
+
+def shares(sizes: list[int], budget: int) -> list[int]:
+    """Max-min fair split of `budget` over values of the given sizes.
+
+    Values smaller than an equal share keep their full size, the others split
+    what is left equally.
+    """
+
+    allotted = list(sizes)
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    remaining = budget
+    while pending:
+        share = remaining // len(pending)
+        if sizes[pending[0]] > share:
+            for i in pending:
+                allotted[i] = share
+            break
+        remaining -= sizes[pending.pop(0)]
+    return allotted
+
+
+def compact_product(product_data, fields: list[str], budget: int = None):
+    """Project a provider payload onto `fields`, in priority order, within budget.
+
+    Fields are dotted paths into the payload and are kept under their last
+    key. Payloads without configured fields are only pruned. Every field gets
+    a fair share of the budget, so a long description is cut down instead of
+    crowding out the specifications after it.
+    """
+
+    if not isinstance(product_data, dict):
+        return product_data
+    if budget is None:
+        budget = Settings.PROMPT_PRODUCT_CHARS
+
+    if fields:
+        projected = {}
+        for path in fields:
+            value = lookup(product_data, path)
+            if value is not None:
+                projected.setdefault(path.split(".")[-1], value)
+    else:
+        projected = product_data
+
+    pruned = prune(projected)
+    sizes = [len(dumps({key: value})) - 1 for key, value in pruned.items()]
+    compacted = {}
+    for (key, value), share in zip(pruned.items(), shares(sizes, budget - 2)):
+        value = fit(value, share - len(dumps(key)) - 2)
+        if value in (None, "", [], {}):
+            continue
+        compacted[key] = value
+
+    before, after = len(str(product_data)), len(dumps(compacted))
+    metrics.observe("compact.chars_before", before)
+    metrics.observe("compact.chars_after", after)
+    logging.info(f"compacted product payload {before} -> {after} chars")
+    return compacted
@@ -0,0 +1,55 @@
+import time
+
+from singleton import Singleton
+
+from server import db
+from utils.cache import TwoTierCache
+from utils.metrics import metrics
+
+from .registry import ProviderAdapter, registry
+
+
+class ProductFetcher(metaclass=Singleton):
+    """Provider payloads cached by canonical product key, one cache per provider.
+
+    Concurrent fetches of one key share a single upstream request, and the
+    `cache.product_<provider>.*` counters report hits and misses per provider.
+    """
+
+    def __init__(self):
+        self.caches: dict[str, TwoTierCache] = {}
+
+    def cache(self, adapter: ProviderAdapter) -> TwoTierCache:
+        if adapter.name not in self.caches:
+            self.caches[adapter.name] = TwoTierCache(
+                f"product_{adapter.name.lower()}",
+                ttl=adapter.ttl,
+                maxsize=512,
+                redis=db.redis,
+            )
+        return self.caches[adapter.name]
+
+    async def upstream(self, url: str, adapter: ProviderAdapter) -> dict:
+        name = adapter.name.lower()
+        async with registry.semaphores[adapter.name]:
+            start = time.perf_counter()
+            try:
+                product_data = await adapter.fetch(url)
+            except Exception:
+                metrics.incr(f"product.{name}.upstream_error")
+                raise
+            finally:
+                metrics.observe(
+                    f"product.{name}.upstream_seconds", time.perf_counter() - start
+                )
+        if not product_data:
+            raise ValueError(f"Empty {adapter.name} product for {url}")
+        return product_data
+
+    async def get(self, url: str, provider: str, refresh: bool = False) -> dict:
+        adapter = registry.get(provider)
+        return await self.cache(adapter).get_or_set(
+            adapter.key(url),
+            lambda: self.upstream(url, adapter),
+            refresh=refresh,
+        )
@@ -0,0 +1,203 @@
+import asyncio
+import dataclasses
+import re
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+
+from apps.amazon.amazon import AmazonClient, product_key
+from apps.digikala.digikala import AsyncDGClient, get_product_id
+from server.config import Settings
+from utils.aionetwork import aio_request
+
+from .schemas import Product
+
+
+@dataclasses.dataclass
+class ProviderAdapter:
+    """How one marketplace is recognized, fetched and read."""
+
+    name: str
+    patterns: list[str]
+    fetch: Callable[[str], Awaitable[dict]]
+    key: Callable[[str], str]
+    normalize: Callable[[dict], Product]
+    ttl: int
+    concurrency: int = 8
+    fields: list[str] = dataclasses.field(default_factory=list)
+
+    def images(self, product_data: dict) -> list[str]:
+        return self.normalize(product_data).images
+
+
+class ProviderRegistry:
+    """Adapters dispatched by one compiled alternation of all url patterns."""
+
+    def __init__(self):
+        self.adapters: dict[str, ProviderAdapter] = {}
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+        self.groups: dict[str, str] = {}
+        self.pattern: re.Pattern | None = None
+
+    def register(self, adapter: ProviderAdapter):
+        self.adapters[adapter.name] = adapter
+        self.semaphores[adapter.name] = asyncio.Semaphore(adapter.concurrency)
+        self.pattern = None
+
+    def compile(self) -> re.Pattern:
+        parts = []
+        self.groups = {}
+        for adapter in self.adapters.values():
+            for pattern in adapter.patterns:
+                group = f"p{len(self.groups)}"
+                self.groups[group] = adapter.name
+                parts.append(f"(?P<{group}>{pattern})")
+        self.pattern = re.compile("|".join(parts), re.IGNORECASE)
+        return self.pattern
+
+    def match(self, url: str) -> ProviderAdapter | None:
+        pattern = self.pattern or self.compile()
+        match = pattern.search(url)
+        if match is None:
+            return None
+        return self.adapters[self.groups[match.lastgroup]]
+
+    def get(self, name: str) -> ProviderAdapter:
+        adapter = self.adapters.get(name)
+        if adapter is None:
+            raise ValueError(f"Unsupported provider {name}")
+        return adapter
+
+
+def first(*values):
+    for value in values:
+        if value:
+            return value
+
+
+async def digikala_fetch(url: str) -> dict:
+    return (await AsyncDGClient().get_product_details(url)).get("data")
+
+
+def digikala_normalize(product_data: dict) -> Product:
+    product = product_data.get("product") or {}
+    images = product.get("images") or {}
+    urls = [
+        (image.get("url") or [None])[0]
+        for image in [images.get("main") or {}] + (images.get("list") or [])
+    ]
+    event = (product_data.get("intrack") or {}).get("eventData") or {}
+    if not any(urls) and event.get("productImageUrl"):
+        urls = [event.get("productImageUrl")]
+
+    brand = product.get("brand") or {}
+    category = product.get("category") or {}
+    return Product(
+        provider="Digikala",
+        title=first(product.get("title_fa"), product.get("title_en")),
+        brand=first(brand.get("title_fa"), brand.get("title_en")),
+        breadcrumb=[category.get("title_fa")] if category.get("title_fa") else [],
+        images=[url for url in urls if url],
+    )
+
+
+def amazon_normalize(product_data: dict) -> Product:
+    breadcrumb = product_data.get("breadCrumbs") or ""
+    return Product(
+        provider="Amazon",
+        title=product_data.get("title"),
+        brand=product_data.get("brand"),
+        breadcrumb=[part.strip() for part in re.split("[›>]", breadcrumb) if part],
+        images=product_data.get("highResolutionImages") or [],
+    )
+
+
+async def sazito_fetch(url: str) -> dict:
+    return (
+        (await aio_request(method="get", url=url)).get("result", {}).get("product", {})
+    )
+
+
+def sazito_key(url: str) -> str:
+    parsed = urlparse(url)
+    host = parsed.netloc.lower().removeprefix("www.")
+    return f"{host}{parsed.path.rstrip('/')}"
+
+
+def sazito_normalize(product_data: dict) -> Product:
+    brand = product_data.get("brand")
+    if isinstance(brand, dict):
+        brand = first(brand.get("title"), brand.get("name"))
+    return Product(
+        provider="Sazito",
+        title=first(product_data.get("title"), product_data.get("name")),
+        brand=brand,
+        images=[image.get("url") for image in product_data.get("images", [])],
+        is_iranian=True,
+    )
+
+
+registry = ProviderRegistry()
+registry.register(
+    ProviderAdapter(
+        name="Amazon",
+        patterns=[r"^https?://(?:[\w-]+\.)*(?:amazon\.[a-z.]+|amzn\.to|a\.co)/"],
+        fetch=lambda url: AmazonClient().get_product(url),
+        key=product_key,
+        normalize=amazon_normalize,
+        ttl=Settings.AMAZON_CACHE_TTL,
+        concurrency=Settings.AMAZON_CONCURRENCY,
+        fields=[
+            "title",
+            "brand",
+            "manufacturer",
+            "breadCrumbs",
+            "features",
+            "attributes",
+            "productOverview",
+            "description",
+            "productDimensions",
+            "itemWeight",
+        ],
+    )
+)
+registry.register(
+    ProviderAdapter(
+        name="Digikala",
+        patterns=[r"^https?://(?:[\w-]+\.)*digikala\.com/.*dkp-\d+"],
+        fetch=digikala_fetch,
+        key=lambda url: f"dkp-{get_product_id(url)}",
+        normalize=digikala_normalize,
+        ttl=Settings.DIGIKALA_PRODUCT_TTL,
+        concurrency=Settings.DG_CONCURRENCY,
+        fields=[
+            "product.title_fa",
+            "product.title_en",
+            "product.brand",
+            "product.category",
+            "product.specifications",
+            "product.review",
+            "product.expert_reviews",
+        ],
+    )
+)
+registry.register(
+    ProviderAdapter(
+        name="Sazito",
+        patterns=[r"^https?://[^/]+/api/v1/products/"],
+        fetch=sazito_fetch,
+        key=sazito_key,
+        normalize=sazito_normalize,
+        ttl=Settings.SAZITO_PRODUCT_TTL,
+        fields=[
+            "title",
+            "name",
+            "brand",
+            "category",
+            "attributes",
+            "properties",
+            "description",
+            "weight",
+            "dimensions",
+        ],
+    )
+)
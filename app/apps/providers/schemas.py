@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class Product(BaseModel):
+    provider: str
+    title: str | None = None
+    brand: str | None = None
+    breadcrumb: list[str] = []
+    images: list[str] = []
+    is_iranian: bool = False
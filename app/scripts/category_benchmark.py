@@ -0,0 +1,85 @@
+"""Offline recall benchmark of the category shortlist against full-list results.
+
+Run from the app directory:
+
+    python -m scripts.category_benchmark samples.json
+
+`samples.json` is a list of `{"product": ..., "category": ...}` items where
+`product` is a stored product payload (or a plain title) and `category` is
+the title or name the full category list prompt picked for it. Items
+without `category` are labelled with a live full-list prompt when `--live`
+is given, and skipped otherwise.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from apps.digikala.categories import CategoryIndex, product_query
+from server.config import Settings
+
+ks = [5, 10, 20, 30, 50]
+
+
+async def label(samples):
+    from apps.bots.services import aio_guess_ai
+
+    categories = json.dumps(Settings().categories, ensure_ascii=False)
+    for sample in samples:
+        if sample.get("category"):
+            continue
+        answer = await aio_guess_ai(
+            sample["product"], "get_category", categories=categories
+        )
+        sample["category"] = answer.get("category")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("samples")
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.samples) as f:
+        samples = json.load(f)
+    if args.live:
+        asyncio.run(label(samples))
+    samples = [sample for sample in samples if sample.get("category")]
+
+    start = time.perf_counter()
+    index = CategoryIndex()
+    print(f"index build: {time.perf_counter() - start:.3f}s")
+
+    hits = {k: 0 for k in ks}
+    search_time = 0
+    for sample in samples:
+        expected = index.resolve(sample["category"])
+        start = time.perf_counter()
+        results = index.search(product_query(sample["product"]), max(ks))
+        search_time += time.perf_counter() - start
+
+        ids = [item.get("id") for item, _ in results]
+        for k in ks:
+            hits[k] += expected.get("id") in ids[:k]
+
+    total = len(samples) or 1
+    print(f"samples: {len(samples)}, mean search: {search_time / total * 1000:.2f}ms")
+    for k in ks:
+        print(f"recall@{k}: {hits[k] / total:.3f}")
+
+    full_chars = len(json.dumps(Settings().categories, ensure_ascii=False))
+    shortlist_chars = len(
+        json.dumps(
+            [
+                CategoryIndex.path(item)
+                for item in index.items[: Settings.CATEGORY_SHORTLIST_SIZE]
+            ],
+            ensure_ascii=False,
+        )
+    )
+    print(f"category prompt chars: full {full_chars}, shortlist ~{shortlist_chars}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Micro-benchmark of `send_msg` and `get_category_data` before and after the
+config store.
+
+Run from the app directory:
+
+    python -m scripts.config_benchmark
+"""
+
+import asyncio
+import json
+import time
+
+from apps.bots import bot_functions, keyboards
+from apps.bots.schemas import MessageStruct
+from server.config import Settings
+
+rounds = 2000
+
+
+class NullBot:
+    async def send_message(self, chat_id, text, **kwargs):
+        return text
+
+
+def legacy_get_category_data(category):
+    with open(Settings.base_dir / "scripts" / "cats2.json") as f:
+        result = json.load(f)
+
+    for r in result:
+        if r.get("category") == category:
+            return r
+    return r
+
+
+async def legacy_send_msg(bot, chat_id, key, **kwargs):
+    with open(Settings.base_dir / "scripts" / "bot_messages.json") as f:
+        msg_struct = MessageStruct(**json.load(f).get(key))
+    keyboard = keyboards.dynamic_keyboard(msg_struct.btn)
+    return await bot.send_message(
+        chat_id=chat_id, text=msg_struct.msg.format(**kwargs), reply_markup=keyboard
+    )
+
+
+def report(name, before, after, count):
+    print(
+        f"{name:20} before {before / count * 1e6:10.1f}us"
+        f"  after {after / count * 1e6:8.1f}us  x{before / after:.0f}"
+    )
+
+
+def bench(func, count, *args):
+    start = time.perf_counter()
+    for _ in range(count):
+        func(*args)
+    return time.perf_counter() - start
+
+
+async def abench(func, count, *args, **kwargs):
+    start = time.perf_counter()
+    for _ in range(count):
+        await func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+async def main():
+    category = Settings().category_list[-1].get("category")
+    count = rounds // 20
+    report(
+        "get_category_data",
+        bench(legacy_get_category_data, count, category),
+        bench(Settings().get_category_data, count, category),
+        count,
+    )
+
+    bot = NullBot()
+    before = await abench(legacy_send_msg, rounds, bot, 1, "sent_url", sheet_link="")
+    after = await abench(
+        bot_functions.send_msg, rounds, bot, 1, "sent_url", sheet_link=""
+    )
+    report("send_msg", before, after, rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
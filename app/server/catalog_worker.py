@@ -0,0 +1,52 @@
+"""Standalone catalog queue worker.
+
+Run from the app directory, as many processes as needed:
+
+    CATALOG_WORKERS=4 python -m server.catalog_worker
+
+Set `CATALOG_WORKERS=0` on the web service so its processes only enqueue.
+"""
+
+import asyncio
+import logging
+
+from apps.ai.client import OpenAIClient
+from apps.ai.ledger import AILedger
+from apps.bots.jobs import CatalogQueue
+from apps.digikala.cache import CategoryMetaCache
+from apps.digikala.categories import CategoryTree
+from apps.digikala.digikala import AsyncDGClient
+
+from . import config, db
+
+
+async def flush_usage():
+    while True:
+        await asyncio.sleep(config.Settings.DG_CATEGORY_USAGE_FLUSH)
+        await CategoryMetaCache().flush_usage()
+
+
+async def main():
+    config.Settings.config_logger()
+
+    await db.init_db()
+    await asyncio.to_thread(CategoryTree)
+    OpenAIClient().client
+
+    ledger = asyncio.create_task(AILedger().run())
+    usage = asyncio.create_task(flush_usage())
+    logging.info("Catalog worker started")
+    try:
+        await CatalogQueue().run(max(config.Settings.CATALOG_WORKERS, 1))
+    finally:
+        ledger.cancel()
+        usage.cancel()
+        await asyncio.gather(ledger, usage, return_exceptions=True)
+        await CategoryMetaCache().flush_usage()
+        await AsyncDGClient().close()
+        await OpenAIClient().close()
+        logging.info("Catalog worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,7 +5,10 @@ import json
 import logging
 import logging.config
 import os
+import threading
+import time
 from pathlib import Path
+from typing import Any, Callable
 
 import dotenv
 from singleton import Singleton
@@ -13,6 +16,56 @@ from singleton import Singleton
 dotenv.load_dotenv()
 
 
+@dataclasses.dataclass
+class ConfigFile:
+    data: Any
+    mtime: int
+    index: dict[str, dict] = dataclasses.field(default_factory=dict)
+
+
+class ConfigStore:
+    """Parse each config file once and reload it only when its mtime changes."""
+
+    def __init__(self, base_dir: Path, check_interval: float = 1):
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self.files: dict[str, ConfigFile] = {}
+        self.checked_at: dict[str, float] = {}
+        self.indexers: dict[str, Callable[[Any], dict[str, dict]]] = {}
+        self.lock = threading.Lock()
+
+    def register_index(self, name: str, indexer: Callable[[Any], dict[str, dict]]):
+        self.indexers[name] = indexer
+        self.files.pop(name, None)
+
+    def load(self, name: str) -> ConfigFile:
+        config = self.files.get(name)
+        now = time.monotonic()
+        if config and now - self.checked_at.get(name, 0) < self.check_interval:
+            return config
+
+        path = self.base_dir / name
+        mtime = path.stat().st_mtime_ns
+        self.checked_at[name] = now
+        if config and config.mtime == mtime:
+            return config
+
+        with self.lock:
+            config = self.files.get(name)
+            if config and config.mtime == mtime:
+                return config
+
+            with open(path) as f:
+                data = json.load(f)
+            indexer = self.indexers.get(name)
+            config = ConfigFile(
+                data=data, mtime=mtime, index=indexer(data) if indexer else {}
+            )
+            self.files[name] = config
+            logging.info(f"Loaded config file {name}")
+            return config
+
+
 @dataclasses.dataclass
 class Settings(metaclass=Singleton):
     """Server config settings."""
@@ -27,8 +80,9 @@ class Settings(metaclass=Singleton):
     profile_service_url: str = "https://profile.pixiee.bot.inbeet.tech"
 
     MAX_SESSION_IDLE_TIME: int = 60 * 60 * 12  # 24 hours
-    MESSAGE_LENGTH: int = 128
-    MIN_MESSAGE_LENGTH: int = 128
+    BOT_CHAT_EDIT_RATE: float = float(os.getenv("BOT_CHAT_EDIT_RATE", default=1))
+    BOT_CHAT_EDIT_BURST: float = float(os.getenv("BOT_CHAT_EDIT_BURST", default=3))
+    BOT_GLOBAL_EDIT_RATE: float = float(os.getenv("BOT_GLOBAL_EDIT_RATE", default=30))
 
     USSO_REFRESH_URL: str = os.getenv("USSO_REFRESH_URL")
     PIXIEE_REFRESH_TOKEN: str = os.getenv("PIXIEE_REFRESH_TOKEN")
@@ -43,6 +97,67 @@ class Settings(metaclass=Singleton):
     APIFY_API_KEY: str = os.getenv("APIFY_API_KEY")
     GOOGLE_SECRET: str = os.getenv("GOOGLE_SECRET")
     PROXY: str = os.getenv("PROXY")
+    AI_CONCURRENCY: int = int(os.getenv("AI_CONCURRENCY", default=8))
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", default=120))
+    OPENAI_RETRIES: int = int(os.getenv("OPENAI_RETRIES", default=2))
+    AI_ESCALATE_CONFIDENCE: float = float(
+        os.getenv("AI_ESCALATE_CONFIDENCE", default=0.6)
+    )
+    AI_BATCH_ATTRIBUTES: bool = (
+        os.getenv("AI_BATCH_ATTRIBUTES", default="true") == "true"
+    )
+    AI_BATCH_PROMPT_CHARS: int = int(os.getenv("AI_BATCH_PROMPT_CHARS", default=48000))
+    AI_CACHE_TTL: int = int(os.getenv("AI_CACHE_TTL", default=60 * 60 * 24 * 7))
+    AI_CACHE_SIZE: int = int(os.getenv("AI_CACHE_SIZE", default=2048))
+    PROMPT_PRODUCT_CHARS: int = int(os.getenv("PROMPT_PRODUCT_CHARS", default=6000))
+    AI_LEDGER_FLUSH_INTERVAL: float = float(
+        os.getenv("AI_LEDGER_FLUSH_INTERVAL", default=5)
+    )
+    CATEGORY_SHORTLIST_SIZE: int = int(os.getenv("CATEGORY_SHORTLIST_SIZE", default=30))
+    DG_TIMEOUT: int = int(os.getenv("DG_TIMEOUT", default=20))
+    DG_RETRIES: int = int(os.getenv("DG_RETRIES", default=3))
+    DG_CONCURRENCY: int = int(os.getenv("DG_CONCURRENCY", default=10))
+    DG_CATEGORY_TTL: int = int(os.getenv("DG_CATEGORY_TTL", default=60 * 60 * 24 * 7))
+    DG_CATEGORY_REFRESH: int = int(
+        os.getenv("DG_CATEGORY_REFRESH", default=60 * 60 * 24)
+    )
+    DG_CATEGORY_WARMUP: int = int(os.getenv("DG_CATEGORY_WARMUP", default=200))
+    DG_CATEGORY_USAGE_FLUSH: int = int(os.getenv("DG_CATEGORY_USAGE_FLUSH", default=60))
+    CATEGORY_ROUTING: str = os.getenv("CATEGORY_ROUTING", default="index")
+    CATEGORY_MIN_MARGIN: float = float(os.getenv("CATEGORY_MIN_MARGIN", default=0.3))
+    BRAND_MATCH_CONFIDENCE: float = float(
+        os.getenv("BRAND_MATCH_CONFIDENCE", default=0.85)
+    )
+    BULK_MAX_URLS: int = int(os.getenv("BULK_MAX_URLS", default=500))
+    CATALOG_WORKERS: int = int(os.getenv("CATALOG_WORKERS", default=4))
+    CATALOG_LEASE_TTL: int = int(os.getenv("CATALOG_LEASE_TTL", default=30))
+    CATALOG_MAX_ATTEMPTS: int = int(os.getenv("CATALOG_MAX_ATTEMPTS", default=3))
+    BULK_FETCH_CONCURRENCY: int = int(os.getenv("BULK_FETCH_CONCURRENCY", default=8))
+    BULK_AI_CONCURRENCY: int = int(os.getenv("BULK_AI_CONCURRENCY", default=4))
+    BULK_PROGRESS_INTERVAL: float = float(
+        os.getenv("BULK_PROGRESS_INTERVAL", default=3)
+    )
+    SHEET_POOL_SIZE: int = int(os.getenv("SHEET_POOL_SIZE", default=5))
+    SHEET_POOL_REFILL_INTERVAL: int = int(
+        os.getenv("SHEET_POOL_REFILL_INTERVAL", default=60)
+    )
+    SHEET_BACKEND: str = os.getenv("SHEET_BACKEND", default="google")
+    SHEET_EXPORT_FORMAT: str = os.getenv("SHEET_EXPORT_FORMAT", default="xlsx")
+    SHEET_EXPORT_DIR: str = os.getenv(
+        "SHEET_EXPORT_DIR", default=str(base_dir / "exports")
+    )
+    SHEET_SEND_FILE: bool = os.getenv("SHEET_SEND_FILE", default="false") == "true"
+    SHEET_CACHE_TTL: int = int(os.getenv("SHEET_CACHE_TTL", default=600))
+    SHEET_CACHE_CHECK_INTERVAL: int = int(
+        os.getenv("SHEET_CACHE_CHECK_INTERVAL", default=30)
+    )
+    AMAZON_CACHE_TTL: int = int(os.getenv("AMAZON_CACHE_TTL", default=60 * 60 * 24 * 7))
+    AMAZON_RUN_TIMEOUT: int = int(os.getenv("AMAZON_RUN_TIMEOUT", default=900))
+    AMAZON_CONCURRENCY: int = int(os.getenv("AMAZON_CONCURRENCY", default=4))
+    DIGIKALA_PRODUCT_TTL: int = int(
+        os.getenv("DIGIKALA_PRODUCT_TTL", default=60 * 60 * 24)
+    )
+    SAZITO_PRODUCT_TTL: int = int(os.getenv("SAZITO_PRODUCT_TTL", default=60 * 60 * 24))
 
     testing: bool = os.getenv("TESTING", default=False)
 
@@ -103,33 +218,48 @@ class Settings(metaclass=Singleton):
 
     @property
     def categories(self):
-        with open(self.base_dir / "scripts" / "cat_name.json") as f:
-            result = json.load(f)
-        return result
+        return config_store.load("cat_name.json").data
+
+    @property
+    def category_list(self) -> list[dict]:
+        return config_store.load("cats2.json").data
 
     def get_category_data(self, category):
-        with open(self.base_dir / "scripts" / "cats2.json") as f:
-            result = json.load(f)
+        config = config_store.load("cats2.json")
 
         if type(category) == dict:
             category = category.get("category")
 
-        for r in result:
-            if r.get("category") == category:
-                return r
-        return r
+        return config.index["by_name"].get(category, config.data[-1])
+
+    def get_category_by_id(self, category_id):
+        return config_store.load("cats2.json").index["by_id"].get(category_id)
 
     def prompts(self, key=None):
-        with open(self.base_dir / "scripts" / "prompts.json") as f:
-            result = json.load(f)
+        result = config_store.load("prompts.json").data
 
         if key:
             return result.get(key)
         return result
 
+    def model_tiers(self, prompt_key) -> list[str]:
+        tiers = config_store.load("model_tiers.json").data
+        return tiers.get(prompt_key) or tiers.get("default") or ["gpt-4o"]
+
     def bot_messages(self, key=None):
-        with open(self.base_dir / "scripts" / "bot_messages.json") as f:
-            result = json.load(f)
+        result = config_store.load("bot_messages.json").data
         if key:
             return result.get(key)
         return result
+
+
+def category_indexes(categories: list[dict]) -> dict[str, dict]:
+    by_name, by_id = {}, {}
+    for category in categories:
+        by_name.setdefault(category.get("category"), category)
+        by_id.setdefault(category.get("id"), category)
+    return {"by_name": by_name, "by_id": by_id}
+
+
+config_store = ConfigStore(Settings.base_dir / "scripts")
+config_store.register_index("cats2.json", category_indexes)
@@ -9,9 +9,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from json_advanced import dumps
 
+from apps.ai.client import OpenAIClient
+from apps.ai.ledger import AILedger
+from apps.ai.routes import router as ai_router
 from apps.bots.handlers import BotFunctions
+from apps.bots.jobs import CatalogQueue
 from apps.bots.routes import router as bots_router
+from apps.digikala.cache import CategoryMetaCache
+from apps.digikala.categories import CategoryTree
+from apps.digikala.digikala import AsyncDGClient
+from apps.digikala.routes import router as digikala_router
 from core import exceptions
+from utils.metrics import metrics
 
 from . import config, db, workers
 
@@ -25,11 +34,26 @@ async def lifespan(app: fastapi.FastAPI):  # type: ignore
 
     await db.init_db()
     await BotFunctions().setup()
+    await asyncio.to_thread(CategoryTree)
+    OpenAIClient().client
 
-    # app.state.worker = asyncio.create_task(workers.init_workers())
+    app.state.worker = asyncio.create_task(workers.init_workers())
+    app.state.ai_ledger = asyncio.create_task(AILedger().run())
+    app.state.catalog_workers = None
+    if config.Settings.CATALOG_WORKERS > 0:
+        app.state.catalog_workers = asyncio.create_task(CatalogQueue().run())
 
     logging.info("Startup complete")
     yield
+    app.state.worker.cancel()
+    if app.state.catalog_workers is not None:
+        app.state.catalog_workers.cancel()
+        await asyncio.gather(app.state.catalog_workers, return_exceptions=True)
+    app.state.ai_ledger.cancel()
+    await asyncio.gather(app.state.ai_ledger, return_exceptions=True)
+    await CategoryMetaCache().flush_usage()
+    await AsyncDGClient().close()
+    await OpenAIClient().close()
     logging.info("Shutdown complete")
 
 
@@ -102,6 +126,8 @@ app.add_middleware(
 )
 
 app.include_router(bots_router)
+app.include_router(digikala_router)
+app.include_router(ai_router)
 
 
 @app.get("/")
@@ -113,3 +139,7 @@ async def index():
 async def index():
     return {"status": "ok"}
 
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot() | {"dg_category": CategoryMetaCache().stats()}
@@ -1,9 +1,12 @@
 import asyncio
+from datetime import datetime
 
 import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from apps.digikala.workers import check_new_notifications
+from apps.digikala.cache import flush_category_usage, warm_category_cache
+from apps.digikala.workers import check_new_notifications, refill_sheet_pool
+from server.config import Settings
 
 irst_timezone = pytz.timezone("Asia/Tehran")
 
@@ -11,6 +14,20 @@ irst_timezone = pytz.timezone("Asia/Tehran")
 async def init_workers():
     scheduler = AsyncIOScheduler()
     scheduler.add_job(check_new_notifications, "interval", minutes=10)
+    scheduler.add_job(
+        warm_category_cache, "interval", hours=6, next_run_time=datetime.now()
+    )
+    scheduler.add_job(
+        flush_category_usage,
+        "interval",
+        seconds=Settings.DG_CATEGORY_USAGE_FLUSH,
+    )
+    scheduler.add_job(
+        refill_sheet_pool,
+        "interval",
+        seconds=Settings.SHEET_POOL_REFILL_INTERVAL,
+        next_run_time=datetime.now(),
+    )
 
     scheduler.start()
 
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio.client import Redis
+
+from utils.metrics import metrics
+
+MISSING = object()
+
+
+def hash_key(*parts) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class TwoTierCache:
+    """In-process LRU in front of Redis with in-flight call merging."""
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        ttl: int,
+        maxsize: int = 1024,
+        redis: Redis | None = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.redis = redis
+        self.lru: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    def redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def count(self, event: str):
+        metrics.incr(f"cache.{self.namespace}.{event}")
+
+    def get_local(self, key: str):
+        item = self.lru.get(key)
+        if item is None:
+            return MISSING
+        expires_at, value = item
+        if expires_at < time.time():
+            self.lru.pop(key, None)
+            return MISSING
+        self.lru.move_to_end(key)
+        return value
+
+    def set_local(self, key: str, value, ttl: int | None = None):
+        self.lru[key] = (time.time() + (ttl or self.ttl), value)
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.maxsize:
+            self.lru.popitem(last=False)
+
+    async def get(self, key: str):
+        value = self.get_local(key)
+        if value is not MISSING:
+            self.count("hit_memory")
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.redis_key(key))
+            except Exception as e:
+                logging.warning(f"{self.namespace} cache redis error: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.set_local(key, value)
+                self.count("hit_redis")
+                return value
+
+        self.count("miss")
+        return MISSING
+
+    async def set(self, key: str, value, ttl: int | None = None):
+        self.set_local(key, value, ttl)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.redis_key(key),
+                json.dumps(value, ensure_ascii=False),
+                ex=ttl or self.ttl,
+            )
+        except Exception as e:
+            logging.warning(f"{self.namespace} cache redis error: {e}")
+
+    async def delete(self, key: str):
+        self.lru.pop(key, None)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self.redis_key(key))
+        except Exception as e:
+            logging.warning(f"{self.namespace} cache redis error: {e}")
+
+    async def get_or_set(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        ttl: int | None = None,
+        refresh: bool = False,
+    ):
+        if not refresh:
+            value = await self.get(key)
+            if value is not MISSING:
+                return value
+
+        if key in self.inflight:
+            self.count("coalesced")
+            return await asyncio.shield(self.inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await factory()
+            await self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        counters = metrics.counters
+        prefix = f"cache.{self.namespace}"
+        hits = counters[f"{prefix}.hit_memory"] + counters[f"{prefix}.hit_redis"]
+        misses = counters[f"{prefix}.miss"]
+        return {
+            "size": len(self.lru),
+            "hits": hits,
+            "misses": misses,
+            "coalesced": counters[f"{prefix}.coalesced"],
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
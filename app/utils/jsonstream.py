@@ -0,0 +1,89 @@
+import json
+import re
+from typing import Any
+
+key_pattern = re.compile(r'^\s*"((?:[^"\\]|\\.)*)"\s*:')
+
+
+class FieldStream:
+    """Incremental parser for the top-level fields of one streamed JSON object.
+
+    Parsing starts at the first `{`, text before it (such as a ```json fence
+    or a note in brackets) is skipped. Each `feed` returns the `(key, value)`
+    pairs that closed in that chunk, fields whose value does not parse are
+    collected in `failed` instead.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.field_start: int | None = None
+        self.done = False
+        self.failed: list[str] = []
+
+    def field(self, text: str) -> tuple[str, Any] | None:
+        if not text.strip():
+            return None
+        try:
+            ((key, value),) = json.loads("{" + text + "}").items()
+            return key, value
+        except ValueError:
+            match = key_pattern.match(text)
+            if match:
+                self.failed.append(json.loads(f'"{match.group(1)}"'))
+            return None
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        if self.done:
+            return []
+        self.buffer += chunk
+        fields = []
+
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.field_start is None:
+                # brackets and quotes in text before the object are not JSON
+                if char == "{":
+                    self.depth = 1
+                    self.field_start = self.pos + 1
+                self.pos += 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+            elif char == "," and self.depth == 1:
+                field = self.field(self.buffer[self.field_start : self.pos])
+                if field:
+                    fields.append(field)
+                self.field_start = self.pos + 1
+
+            if self.depth == 0 and self.field_start is not None:
+                field = self.field(self.buffer[self.field_start : self.pos])
+                if field:
+                    fields.append(field)
+                self.done = True
+                break
+            self.pos += 1
+
+        return fields
+
+    def close(self) -> list[str]:
+        """Mark a field cut off by the end of the stream as failed."""
+
+        if not self.done and self.field_start is not None:
+            self.field(self.buffer[self.field_start :])
+            self.done = True
+        return self.failed
@@ -0,0 +1,45 @@
+from collections import defaultdict, deque
+
+from singleton import Singleton
+
+
+def percentile(samples: list[float], q: float) -> float | None:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Metrics(metaclass=Singleton):
+    def __init__(self, max_samples: int = 1000):
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def incr(self, name: str, value: float = 1):
+        self.counters[name] += value
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        self.samples[name].append(value)
+
+    def summary(self, name: str) -> dict:
+        samples = list(self.samples.get(name, []))
+        return {
+            "count": len(samples),
+            "p50": percentile(samples, 0.5),
+            "p95": percentile(samples, 0.95),
+            "max": max(samples) if samples else None,
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "summaries": {name: self.summary(name) for name in self.samples},
+        }
+
+
+metrics = Metrics()
@@ -71,6 +71,16 @@ def is_valid_url(url: str) -> bool:
     return re.match(url_pattern, url) is not None
 
 
+url_search_pattern = re.compile(r"https?://[^\s,;\"'<>]+", re.IGNORECASE)
+
+
+def extract_urls(text: str) -> list[str]:
+    """Unique valid urls of a pasted text block or csv, in their original order."""
+
+    urls = [url.rstrip(".)") for url in url_search_pattern.findall(text or "")]
+    return list(dict.fromkeys(url for url in urls if is_valid_url(url)))
+
+
 def split_text(text, max_chunk_size=4096):
     # Split text into paragraphs
     paragraphs = text.split("\n")
@@ -203,3 +213,32 @@ def get_dict_data(data, key, value):
     for r in data:
         if r.get(key) == value:
             return r
+
+
+persian_translation = str.maketrans(
+    {
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        "\u200c": " ",  # zero width non-joiner
+        "\u200f": " ",
+        "\u200e": " ",
+        **{chr(0x06F0 + i): str(i) for i in range(10)},
+        **{chr(0x0660 + i): str(i) for i in range(10)},
+    }
+)
+diacritics_pattern = re.compile("[\u064b-\u065f\u0670\u0640]")
+non_word_pattern = re.compile(r"[^\w]+")
+
+
+def normalize_text(text: str) -> str:
+    text = str(text).translate(persian_translation).lower()
+    text = diacritics_pattern.sub("", text)
+    return non_word_pattern.sub(" ", text).strip()